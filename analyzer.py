@@ -5,29 +5,53 @@ Evalúa rendimiento de políticas de cache y modelos LLM usando consultas reales
 """
 
 import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import io
 import logging
-import random
+import re
+import threading
 import time
 import os
+
+import numpy as np
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List
 from dotenv import load_dotenv
-import matplotlib
-matplotlib.use('Agg')  # Configuración para generar gráficos sin interfaz gráfica
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
-import numpy as np
+from sqlalchemy import select, text
 
 # Cargar variables de entorno
 load_dotenv()
 
 from database import PostgreSQLManager, Question, MultiModelResult
-from cache_manager import CacheManager, CacheAnalyzer
+from cache_manager import CacheManager, CacheAnalyzer, SemanticCache
 from dummy_llm_service import DummyLLMService
 
 logger = logging.getLogger(__name__)
 
+# Fila liviana para pasar preguntas al pipeline LLM sin objetos ORM
+QuestionItem = collections.namedtuple('QuestionItem', ['id', 'question_title', 'question_content'])
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """
+    Payload que se escribe al cache en cada miss.
+
+    Con slots=True la instancia no carga un __dict__ propio: menos memoria y
+    alocación más rápida que un dict de 4 claves repetido miles de veces.
+    orjson la serializa nativamente igual que un dict.
+    """
+    quality_score: float
+    llm_answer: str
+    original_answer: str
+    timestamp: str
+    # Metadata que CacheManager.set completa en cada escritura
+    cached_at: float = 0.0
+    policy: str = ''
+
 
 class ExperimentRunner:
     """
@@ -43,6 +67,16 @@ class ExperimentRunner:
         self.cache_analyzer = CacheAnalyzer()
         self.results = {}  # Almacena resultados de todos los experimentos
         self.max_requests = 10000  # OPTIMIZADO PARA REQUISITO: 10,000+ consultas con máxima velocidad
+        self._llm_result_cache = {}  # Cache exacto de resultados Dummy-LLM por clave estable
+        self._semantic_cache = SemanticCache()  # Segundo nivel: casi-duplicados por coseno
+        self._query_columns = None   # Columnas + payloads compartidos entre experimentos
+        self._trace_indices = None   # Traza de accesos compartida entre configuraciones
+
+        # Contadores de procesamiento LLM. Counter + lock en lugar de un dict
+        # mutado desde varias corrutinas/threads: los incrementos siguen
+        # siendo correctos aunque el fan-out sea concurrente
+        self.stats = collections.Counter()
+        self._stats_lock = threading.Lock()
         
         # Configurar servicios LLM
         if use_multi_llm:
@@ -77,38 +111,66 @@ class ExperimentRunner:
         # Configuraciones de prueba
         cache_sizes = [10, 100, 500, 1000, 2000]
         policies = ['LRU', 'TTL', 'TTL-LRU']
-        
+        configs = [(policy, size) for policy in policies for size in cache_sizes]
+
         experiment_results = {}
-        
-        for policy in policies:
-            for cache_size in cache_sizes:
+
+        if not self.multi_llm_enabled:
+            # Las 15 configuraciones no comparten estado entre sí (cada una
+            # con su CacheManager y su base lógica de Redis), así que corren
+            # en paralelo en un pool de procesos. Solo la ruta con dummy-LLM
+            # queda secuencial: necesita las corrutinas del event loop.
+            if not await self._ensure_query_data():
+                return {}
+
+            (_ids, titles, contents, _qs, _la, _oa, cache_payloads) = self._query_columns
+
+            loop = asyncio.get_running_loop()
+            max_workers = min(len(configs), os.cpu_count() or 1)
+            logger.info(f"Ejecutando {len(configs)} configuraciones en paralelo ({max_workers} workers)")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [
+                    # db 1..15: la base 0 queda para el resto del sistema
+                    loop.run_in_executor(
+                        pool, _run_cache_config, policy, cache_size, db_index,
+                        self._trace_indices, titles, contents, cache_payloads
+                    )
+                    for db_index, (policy, cache_size) in enumerate(configs, start=1)
+                ]
+                all_metrics = await asyncio.gather(*futures)
+
+            for (policy, cache_size), metrics in zip(configs, all_metrics):
+                test_name = f"{policy}_size_{cache_size}"
+                experiment_results[test_name] = metrics
+                hit_rate = metrics['hit_rate_percent']
+                evictions = metrics['evictions']
+                logger.info(f"Completado {test_name}: Hit Rate={hit_rate:.1f}%, Evictions={evictions}")
+        else:
+            for policy, cache_size in configs:
                 test_name = f"{policy}_size_{cache_size}"
                 logger.info(f"Ejecutando prueba: {test_name}")
-                
+
                 # Configurar cache con política y tamaño específicos
                 cache_manager = CacheManager(policy=policy, cache_size=cache_size)
-                
+
                 # Procesar consultas reales randomizadas
                 await self._process_real_queries(cache_manager)
-                
+
                 # Recopilar métricas de rendimiento
-                metrics = cache_manager.get_detailed_metrics()
+                metrics = await cache_manager.get_detailed_metrics()
                 experiment_results[test_name] = metrics
-                
+
                 # Registrar resultados intermedios
                 hit_rate = metrics['hit_rate_percent']
                 evictions = metrics['evictions']
                 logger.info(f"Completado {test_name}: Hit Rate={hit_rate:.1f}%, Evictions={evictions}")
-                
+
                 # Limpiar cache para la siguiente prueba
-                cache_manager.clear_cache()
-                
-                # Pausa entre experimentos para estabilizar métricas
-                await asyncio.sleep(1)
+                await cache_manager.clear_cache()
         
         # Generar reportes y visualizaciones
         self.results = experiment_results
-        self._generate_charts()
+        await self._generate_charts()
         self._generate_comparison_report()
         
         return experiment_results
@@ -132,81 +194,119 @@ class ExperimentRunner:
         
         session = self.db.get_session()
         try:
-            # Obtener preguntas que no han sido procesadas con LLM
+            # Construir filtro de preguntas que no han sido procesadas con LLM
             if self.multi_llm_enabled:
-                # Para dummy-LLM, buscar preguntas sin procesar en multi_model_results
-                processed_question_ids = session.query(
-                    session.query(MultiModelResult.question_id).distinct().subquery().c.question_id
-                ).all()
-                processed_ids = [pid[0] for pid in processed_question_ids] if processed_question_ids else []
-                
-                unprocessed_questions = session.query(Question).filter(
-                    ~Question.id.in_(processed_ids)
-                ).all()
+                # Para dummy-LLM: antijoin NOT EXISTS contra multi_model_results.
+                # Se resuelve completo en el servidor; antes se materializaban
+                # todos los IDs procesados en Python y se enviaban de vuelta
+                # en un IN gigante
+                unprocessed_filter = ~(
+                    session.query(MultiModelResult)
+                    .filter(MultiModelResult.question_id == Question.id)
+                    .exists()
+                )
             else:
                 # Para LLM simple, usar filtro tradicional
-                unprocessed_questions = session.query(Question).filter(
-                    (Question.llm_answer.is_(None)) | (Question.llm_answer == '')
-                ).all()
-            
-            if not unprocessed_questions:
+                unprocessed_filter = (Question.llm_answer.is_(None)) | (Question.llm_answer == '')
+
+            # Contar pendientes sin materializar las filas
+            total_available = session.query(Question.id).filter(unprocessed_filter).count()
+
+            if not total_available:
                 logger.info("Todas las preguntas ya han sido procesadas con LLM")
                 return {"processed": 0, "total": 0}
-            
+
             # Aplicar límite de solicitudes si está configurado
-            total_available = len(unprocessed_questions)
+            total_to_process = total_available
             if self.max_requests and self.max_requests < total_available:
-                unprocessed_questions = unprocessed_questions[:self.max_requests]
-                logger.info(f"Límite aplicado: procesando {len(unprocessed_questions)} de {total_available} preguntas disponibles")
-            
-            logger.info(f"Procesando {len(unprocessed_questions)} preguntas con {llm_mode}")
+                total_to_process = self.max_requests
+                logger.info(f"Límite aplicado: procesando {total_to_process} de {total_available} preguntas disponibles")
+
+            logger.info(f"Procesando {total_to_process} preguntas con {llm_mode}")
             
             start_time = time.time()
             processed_count = 0
             quality_scores = []
-            
-            for i, question in enumerate(unprocessed_questions):
-                if self.multi_llm_enabled:
-                    await self._process_with_dummy_llm(question)
-                else:
-                    question.quality_score = 1.0
-                    logger.debug(f"Sin Dummy-LLM habilitado para pregunta ID {question.id}")
-                
-                # Contabilizar procesamiento exitoso
+            batch_size = 50
+
+            # Doble buffer: mientras el lote N se persiste en un thread, el
+            # lote N+1 ya está corriendo sus llamadas LLM en el event loop
+            writes_q = asyncio.Queue(maxsize=2)
+
+            async def _writer_loop():
+                while True:
+                    rows = await writes_q.get()
+                    try:
+                        await asyncio.to_thread(self._flush_question_updates, rows)
+                    finally:
+                        writes_q.task_done()
+
+            writer_task = asyncio.create_task(_writer_loop())
+
+            async def _handle_chunk(chunk):
+                nonlocal processed_count
                 if self.multi_llm_enabled:
-                    # Para dummy-LLM, verificar si se guardaron resultados
-                    multi_results = session.query(MultiModelResult).filter_by(question_id=question.id).first()
-                    if multi_results:
-                        processed_count += 1
-                        quality_scores.append(multi_results.best_score)
+                    # Lote completo en una sola pasada: los caches se
+                    # resuelven por pregunta y el resto comparte una única
+                    # "llamada" por modelo vía process_questions_batch
+                    updates = await self._process_chunk_with_dummy_llm(chunk)
                 else:
-                    # Para LLM simple, verificar respuesta tradicional
-                    if question.llm_answer:
+                    updates = [{'id': q.id, 'quality_score': 1.0} for q in chunk]
+
+                rows = []
+                for row_update in updates:
+                    if not row_update:
+                        continue
+                    rows.append(row_update)
+                    # Contabilizar procesamiento exitoso (con respuesta generada)
+                    if 'llm_answer' in row_update or not self.multi_llm_enabled:
                         processed_count += 1
-                        quality_scores.append(question.quality_score)
-                
-                # Commit cada 10 preguntas para evitar transacciones largas
-                if (i + 1) % 10 == 0:
-                    session.commit()
+                        quality_scores.append(row_update['quality_score'])
+
+                # Encolar el lote para el escritor en background: un solo
+                # UPDATE parametrizado + un commit por lote
+                if rows:
+                    await writes_q.put(rows)
+
+            chunk = []
+            done = 0
+            async for question in self._iter_unprocessed_questions(session, unprocessed_filter):
+                if done >= total_to_process:
+                    break
+                chunk.append(question)
+                done += 1
+
+                if len(chunk) >= batch_size:
+                    await _handle_chunk(chunk)
+                    chunk = []
                     elapsed = time.time() - start_time
-                    rate = (i + 1) / elapsed
-                    logger.info(f"Progreso {llm_mode}: {i+1}/{len(unprocessed_questions)} preguntas ({rate:.1f} q/s)")
-            
-            # Commit final
-            session.commit()
+                    rate = done / elapsed
+                    logger.info(f"Progreso {llm_mode}: {done}/{total_to_process} preguntas ({rate:.1f} q/s)")
+
+            # Último lote parcial, luego esperar a que el escritor drene la cola
+            if chunk:
+                await _handle_chunk(chunk)
+            await writes_q.join()
+            writer_task.cancel()
             
             elapsed_total = time.time() - start_time
             avg_quality = sum(quality_scores) / len(quality_scores) if quality_scores else 0
             
             results = {
                 "processed": processed_count,
-                "total": len(unprocessed_questions),
+                "total": total_to_process,
                 "avg_quality_score": avg_quality,
                 "processing_time": elapsed_total,
                 "questions_per_second": processed_count / elapsed_total if elapsed_total > 0 else 0
             }
             
-            logger.info(f"Análisis LLM completado: {processed_count}/{len(unprocessed_questions)} preguntas")
+            logger.info(f"Análisis LLM completado: {processed_count}/{total_to_process} preguntas")
+            logger.info(
+                f"Estadísticas LLM: {self.stats['llm_calls']} llamadas, "
+                f"{self.stats['exact_cache_hits']} hits exactos, "
+                f"{self.stats['semantic_cache_hits']} hits semánticos, "
+                f"{self.stats['errors']} errores"
+            )
             logger.info(f"Score de calidad promedio: {avg_quality:.2f}")
             logger.info(f"Tiempo total: {elapsed_total:.2f}s ({results['questions_per_second']:.2f} q/s)")
             
@@ -219,82 +319,235 @@ class ExperimentRunner:
         finally:
             session.close()
     
+    def _flush_question_updates(self, rows):
+        """
+        Persiste un lote de actualizaciones por id vía COPY + staging.
+
+        Corre en un thread del escritor en background. bulk_update_mappings
+        emitía un UPDATE por fila (un round-trip cada uno con psycopg2);
+        bulk_update_llm_results aplica el lote completo en un solo stream
+        COPY más un UPDATE set-based. Las filas sin llm_answer (caminos de
+        error) viajan con NULL y el UPDATE las resuelve con COALESCE: solo
+        actualizan el score, sin pisar una respuesta ya persistida.
+
+        Args:
+            rows: Lista de dicts con 'id', 'quality_score' y opcionalmente
+                'llm_answer'
+        """
+        try:
+            self.db.bulk_update_llm_results(
+                (row['id'], row.get('quality_score'), row.get('llm_answer'))
+                for row in rows
+            )
+        except Exception as e:
+            logger.error(f"Error persistiendo lote de actualizaciones: {e}")
+
+    async def _iter_unprocessed_questions(self, session, unprocessed_filter, batch_size=200):
+        """
+        Itera preguntas sin procesar usando paginación keyset (id > last_id).
+
+        Mantiene la memoria en O(batch_size) en lugar de materializar todas
+        las filas pendientes de una vez, y cada SELECT se resuelve con un
+        range scan sobre la clave primaria. Se consultan solo las tres
+        columnas que usa el procesamiento LLM, evitando instancias ORM
+        completas (identity map + InstanceState) que quedarían vivas durante
+        todo el fan-out.
+
+        Args:
+            session: Sesión SQLAlchemy activa
+            unprocessed_filter: Filtro de preguntas pendientes
+            batch_size: Cantidad de filas por página
+
+        Yields:
+            Filas livianas (id, question_title, question_content) en orden
+            ascendente de id, con acceso por atributo
+        """
+        def _fetch_page(last_id):
+            return (
+                session.query(Question.id, Question.question_title, Question.question_content)
+                .filter(unprocessed_filter, Question.id > last_id)
+                .order_by(Question.id)
+                .limit(batch_size)
+                .all()
+            )
+
+        last_id = 0
+        while True:
+            # La consulta es síncrona: ejecutarla en un thread para que el
+            # event loop siga procesando mientras llega la página siguiente
+            batch = await asyncio.to_thread(_fetch_page, last_id)
+            if not batch:
+                break
+            for row in batch:
+                yield row
+            last_id = batch[-1].id
+
+    async def _ensure_query_data(self):
+        """
+        Carga (una sola vez) las columnas de preguntas, los payloads de miss
+        y la traza de accesos compartidos entre configuraciones.
+
+        Las columnas se cargan como tuplas Core (SoA): sin identity map ni
+        instrumentación ORM en un flujo 99% read-only. El fetch corre en un
+        thread para no bloquear el event loop.
+
+        Returns:
+            bool: True si hay datos disponibles para los experimentos
+        """
+        if self._query_columns is not None and self._trace_indices is not None:
+            return True
+
+        session = self.db.get_session()
+        try:
+            def _fetch_all_rows():
+                return session.execute(
+                    select(
+                        Question.id,
+                        Question.question_title,
+                        Question.question_content,
+                        Question.quality_score,
+                        Question.llm_answer,
+                        Question.original_answer
+                    )
+                ).all()
+
+            rows = await asyncio.to_thread(_fetch_all_rows)
+
+            if not rows:
+                logger.error("No hay preguntas en la base de datos")
+                return False
+
+            # Representación columnar: listas paralelas indexadas por posición.
+            # Los payloads de miss se construyen una sola vez y se comparten
+            # entre las 15 configuraciones: rearmar el mismo payload en cada
+            # miss (hasta ~150k veces en total) solo presiona el allocator
+            ids = [r[0] for r in rows]
+            titles = [r[1] for r in rows]
+            contents = [r[2] for r in rows]
+            quality_scores = [r[3] for r in rows]
+            llm_answers = [r[4] for r in rows]
+            original_answers = [r[5] for r in rows]
+
+            payload_iso = datetime.now().isoformat()
+            cache_payloads = [
+                CacheEntry(
+                    quality_score=quality_scores[j] or 2.0,
+                    llm_answer=llm_answers[j] or 'Respuesta predeterminada',
+                    original_answer=original_answers[j],
+                    timestamp=payload_iso
+                )
+                for j in range(len(ids))
+            ]
+            self._query_columns = (
+                ids, titles, contents, quality_scores, llm_answers,
+                original_answers, cache_payloads
+            )
+
+            # La traza de accesos se sortea UNA vez (seed fija) y se comparte
+            # entre las 15 configuraciones: además de ahorrar 14 sorteos de
+            # 10k índices, todas las políticas ven exactamente el mismo patrón
+            # de accesos, así que los hit rates son comparables entre sí
+            num_queries = self.max_requests if self.max_requests else 10000
+            rng = np.random.default_rng(42)
+            self._trace_indices = rng.integers(
+                0, len(ids), size=num_queries, dtype=np.int64
+            ).tolist()
+            return True
+        finally:
+            session.close()
+
     async def _process_real_queries(self, cache_manager):
         """
         Procesa consultas randomizadas desde la base de datos.
-        
+
         Selecciona aleatoriamente preguntas de la BD (con repetición permitida)
         para simular patrones de acceso reales. Usa max_requests si está configurado,
         sino procesa 13,000 consultas por defecto.
-        
+
         Args:
             cache_manager: Instancia del gestor de cache configurado
         """
+        if not await self._ensure_query_data():
+            return
+
         session = self.db.get_session()
         try:
-            # Cargar todas las preguntas disponibles
-            all_questions = session.query(Question).all()
-            
-            if not all_questions:
-                logger.error("No hay preguntas en la base de datos")
-                return
-            
-            # Generar conjunto de consultas randomizadas (usar max_requests si está configurado)
-            num_queries = self.max_requests if self.max_requests else 10000
-            selected_questions = []
-            
-            # Permitir repetición para alcanzar el volumen requerido
-            for _ in range(num_queries):
-                random_question = random.choice(all_questions)
-                selected_questions.append(random_question)
-            
-            logger.info(f"Procesando {num_queries} consultas randomizadas de {len(all_questions)} preguntas disponibles")
-            start_time = time.time()
-            
-            for i, question in enumerate(selected_questions):
+            (ids, titles, contents, quality_scores, llm_answers,
+             original_answers, cache_payloads) = self._query_columns
+
+            indices = self._trace_indices
+            num_queries = len(indices)
+
+            logger.info(f"Procesando {num_queries} consultas randomizadas de {len(ids)} preguntas disponibles")
+            start_time = time.monotonic()
+
+            touched = collections.Counter()  # Accesos pendientes por pregunta
+            llm_updates = []                 # Respuestas LLM pendientes de persistir
+
+            # Aliases locales de los métodos calientes: evita un LOAD_ATTR por
+            # iteración en un loop de 10k+ vueltas
+            cm_get = cache_manager.get
+            cm_set = cache_manager.set
+            log_info = logger.info
+
+            for i, j in enumerate(indices):
+                title = titles[j]
+                content = contents[j] or ''
+
                 # Verificar si la consulta está en cache
-                cached_result = cache_manager.get(question.question_title, question.question_content or '')
-                
+                cached_result = await cm_get(title, content)
+
                 if cached_result:
                     # Cache HIT: datos encontrados en cache
                     pass
                 else:
-                    # Cache MISS: cargar datos desde BD y cachear
-                    cache_data = {
-                        'quality_score': question.quality_score or 2.0,
-                        'llm_answer': question.llm_answer or 'Respuesta predeterminada',
-                        'original_answer': question.original_answer,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    
-                    cache_manager.set(question.question_title, question.question_content or '', cache_data)
-                
+                    # Cache MISS: reutilizar el payload precalculado
+                    await cm_set(title, content, cache_payloads[j])
+
                 # OPTIMIZACIÓN PARA 10K+: Procesamiento LLM muy selectivo
-                if self.multi_llm_enabled and not question.llm_answer and i % 500 == 0:
-                    await self._process_with_dummy_llm(question)
-                
-                # OPTIMIZACIÓN BD PARA 10K+: Actualizar BD cada 2000 consultas
+                if self.multi_llm_enabled and not llm_answers[j] and i % 500 == 0:
+                    item = QuestionItem(ids[j], title, contents[j])
+                    llm_update = await self._process_with_dummy_llm(item)
+                    if llm_update:
+                        llm_answers[j] = llm_update.get('llm_answer', llm_answers[j])
+                        quality_scores[j] = llm_update['quality_score']
+                        # Refrescar el payload compartido para futuros misses
+                        cache_payloads[j].quality_score = quality_scores[j] or 2.0
+                        cache_payloads[j].llm_answer = llm_answers[j] or 'Respuesta predeterminada'
+                        llm_updates.append(llm_update)
+
+                # OPTIMIZACIÓN BD PARA 10K+: diferir contadores de acceso
                 if i % 2000 == 0:
-                    question.access_count += 1
-                    question.last_access = datetime.now()
-                
-                # OPTIMIZACIÓN LOGGING PARA 10K+: ETA y commits por lotes
+                    touched[ids[j]] += 1
+
+                # OPTIMIZACIÓN LOGGING PARA 10K+: ETA por lotes
                 if (i + 1) % 1000 == 0:
-                    elapsed = time.time() - start_time
+                    elapsed = time.monotonic() - start_time
                     rate = (i + 1) / elapsed
                     remaining = num_queries - (i + 1)
                     eta = remaining / rate if rate > 0 else 0
-                    logger.info(f"🔥 PROCESANDO 10K+: {i+1}/{num_queries} ({rate:.1f} q/s) - ETA: {eta/60:.1f} min")
-                    
-                    # Commit por lotes cada 5000 consultas para mejor rendimiento
-                    if (i + 1) % 5000 == 0:
-                        session.commit()
-                        logger.info(f"💾 Commit por lotes: {i+1} consultas guardadas")
-            
-            # Commit final
-            session.commit()
-            
-            elapsed_total = time.time() - start_time
+                    log_info(f"🔥 PROCESANDO 10K+: {i+1}/{num_queries} ({rate:.1f} q/s) - ETA: {eta/60:.1f} min")
+
+            # Persistir contadores diferidos con un executemany (delta por id)
+            def _flush_access_counts():
+                if touched:
+                    params = [{'id': qid, 'delta': count} for qid, count in touched.items()]
+                    session.execute(
+                        text(
+                            "UPDATE questions "
+                            "SET access_count = access_count + :delta, last_access = now() "
+                            "WHERE id = :id"
+                        ),
+                        params
+                    )
+                session.commit()
+
+            await asyncio.to_thread(_flush_access_counts)
+
+            if llm_updates:
+                await asyncio.to_thread(self._flush_question_updates, llm_updates)
+
+            elapsed_total = time.monotonic() - start_time
             rate_final = num_queries / elapsed_total
             logger.info(f"🎯 COMPLETADO 10K+: {num_queries} consultas en {elapsed_total/60:.1f} minutos ({rate_final:.1f} q/s)")
             
@@ -306,70 +559,214 @@ class ExperimentRunner:
     
 
 
+    @staticmethod
+    def _llm_cache_key(question_title: str, question_content: str = "") -> str:
+        """
+        Genera una clave estable para el cache de resultados LLM.
+
+        Usa blake2b en lugar de hash() porque hash() está salteado por proceso
+        (PYTHONHASHSEED), por lo que las claves no sobreviven entre ejecuciones.
+        Cada campo se normaliza por separado (casefold + colapso de espacios)
+        y recién después se unen con \\x1f: como \\x1f también es espacio
+        Unicode, normalizar el string ya unido colapsaba el separador y
+        borraba el límite título/contenido.
+
+        Args:
+            question_title: Título de la pregunta
+            question_content: Contenido adicional de la pregunta
+
+        Returns:
+            str: Clave hexadecimal de 128 bits con prefijo llm_quality:
+        """
+        title = re.sub(r"\s+", " ", question_title.strip().casefold())
+        content = re.sub(r"\s+", " ", question_content.strip().casefold())
+        digest = hashlib.blake2b(
+            f"{title}\x1f{content}".encode('utf-8'), digest_size=16
+        ).hexdigest()
+        return f"llm_quality:{digest}"
+
     async def _process_with_dummy_llm(self, question):
         """
         Procesa una pregunta con múltiples modelos simulados y guarda el mejor resultado.
-        
+
+        Caso degenerado del camino por lotes: delega en
+        _process_chunk_with_dummy_llm con un lote de una sola pregunta.
+
         Args:
             question: Instancia de Question de SQLAlchemy
+
+        Returns:
+            Dict con el mapping de actualización
+            ({'id', 'llm_answer', 'quality_score'}) o solo {'id', 'quality_score'}
+            si el procesamiento falló.
+        """
+        return (await self._process_chunk_with_dummy_llm([question]))[0]
+
+    async def _process_chunk_with_dummy_llm(self, questions):
+        """
+        Procesa un lote de preguntas con los modelos simulados en una llamada.
+
+        Primero resuelve cada pregunta contra el cache exacto (digest
+        estable) y el semántico; las restantes viajan juntas a
+        process_questions_batch, que paga el overhead por modelo (semáforo +
+        latencia simulada) una vez por lote en vez de una vez por pregunta.
+
+        Args:
+            questions: Lista de instancias de Question de SQLAlchemy
+
+        Returns:
+            Lista de mappings de actualización alineada con questions.
+        """
+        resolved = [None] * len(questions)
+        pending = []  # índices sin resultado cacheado
+
+        for idx, question in enumerate(questions):
+            title = question.question_title
+            content = question.question_content or ''
+
+            # Reutilizar resultado cacheado si la pregunta ya fue procesada
+            results = self._llm_result_cache.get(self._llm_cache_key(title, content))
+            if results is not None:
+                with self._stats_lock:
+                    self.stats['exact_cache_hits'] += 1
+            else:
+                # Segundo nivel: cache semántico para preguntas parafraseadas
+                cached = self._semantic_cache.get(title, content)
+                if cached is not None:
+                    results = {
+                        model: dict(result, provider='semantic_cache')
+                        for model, result in cached.items()
+                    }
+                    with self._stats_lock:
+                        self.stats['semantic_cache_hits'] += 1
+
+            if results is not None:
+                resolved[idx] = results
+            else:
+                pending.append(idx)
+
+        if pending:
+            pairs = [
+                (questions[i].question_title, questions[i].question_content or '')
+                for i in pending
+            ]
+            try:
+                batch_results = await self.dummy_llm_service.process_questions_batch(pairs)
+            except Exception as e:
+                logger.error(f"Error en lote Dummy-LLM: {e}")
+                with self._stats_lock:
+                    self.stats['errors'] += len(pending)
+                batch_results = [{} for _ in pending]
+
+            with self._stats_lock:
+                self.stats['llm_calls'] += len(pending)
+
+            for i, results in zip(pending, batch_results):
+                if results:
+                    self._semantic_cache.add(
+                        questions[i].question_title,
+                        questions[i].question_content or '',
+                        results
+                    )
+                resolved[i] = results
+
+        return [
+            await self._finalize_dummy_result(question, results)
+            for question, results in zip(questions, resolved)
+        ]
+
+    async def _finalize_dummy_result(self, question, results):
+        """
+        Elige el mejor modelo, persiste los resultados y arma el mapping.
+
+        Args:
+            question: Instancia de Question de SQLAlchemy
+            results: Dict de resultados por modelo (vacío/None si falló)
+
+        Returns:
+            Dict con el mapping de actualización para el escritor.
         """
         try:
-            # Procesar con todos los modelos simulados
-            results = await self.dummy_llm_service.process_question_multi_model(
-                question.question_title,
-                question.question_content or ''
-            )
-            
             if results:
-                # Encontrar el mejor resultado por calidad
-                best_model = max(results.keys(), key=lambda m: results[m]['quality_score'])
+                # Guardar en cache con la misma clave derivada usada en el get
+                cache_key = self._llm_cache_key(
+                    question.question_title,
+                    question.question_content or ''
+                )
+                self._llm_result_cache[cache_key] = results
+
+                # Encontrar el mejor resultado por calidad: un solo barrido
+                # vectorizado en lugar de max() con callback Python por modelo
+                model_names = list(results.keys())
+                scores = np.fromiter(
+                    (results[m]['quality_score'] for m in model_names),
+                    dtype=np.float32,
+                    count=len(model_names)
+                )
+                best_model = model_names[int(scores.argmax())]
                 best_result = results[best_model]
-                
-                # Actualizar pregunta con mejor resultado
-                question.llm_answer = best_result['answer']
-                question.quality_score = best_result['quality_score']
-                
+
                 logger.debug(f"Pregunta ID {question.id}: Dummy-LLM procesado, mejor={best_model}, score={best_result['quality_score']:.2f}")
-                
+
                 # Guardar resultados detallados de todos los modelos
                 await self._save_multi_model_results(question.id, results)
-                
-            else:
-                question.quality_score = 1.0
-                logger.warning(f"Error procesando pregunta ID {question.id} con Dummy-LLM")
-                
+
+                return {
+                    'id': question.id,
+                    'llm_answer': best_result['answer'],
+                    'quality_score': best_result['quality_score']
+                }
+
+            logger.warning(f"Error procesando pregunta ID {question.id} con Dummy-LLM")
+            return {'id': question.id, 'quality_score': 1.0}
+
         except Exception as e:
             logger.error(f"Error en procesamiento Dummy-LLM para pregunta {question.id}: {e}")
-            question.quality_score = 1.0
+            with self._stats_lock:
+                self.stats['errors'] += 1
+            return {'id': question.id, 'quality_score': 1.0}
     
     async def _save_multi_model_results(self, question_id: int, results: dict):
         """
         Guarda los resultados detallados de múltiples modelos en la base de datos.
-        
+
+        El trabajo SQLAlchemy es síncrono, así que se delega a un thread con
+        asyncio.to_thread para no bloquear el event loop mientras se escriben
+        los resultados.
+
+        Args:
+            question_id: ID de la pregunta
+            results: Diccionario con resultados de cada modelo
+        """
+        await asyncio.to_thread(self._persist_multi_model_results, question_id, results)
+
+    def _persist_multi_model_results(self, question_id: int, results: dict):
+        """
+        Escritura síncrona de resultados multi-modelo (ejecutada en un thread).
+
         Args:
             question_id: ID de la pregunta
             results: Diccionario con resultados de cada modelo
         """
         try:
-            from sqlalchemy import text
             session = self.db.get_session()
-            
-            # Insertar/actualizar resultados de cada modelo
-            # La tabla multi_model_results ya existe desde init.sql
-            for model, result in results.items():
-                insert_sql = text("""
-                INSERT INTO multi_model_results 
-                (question_id, model_name, model_provider, answer, quality_score, response_time, cost_tier)
-                VALUES (:question_id, :model_name, :model_provider, :answer, :quality_score, :response_time, :cost_tier)
-                ON CONFLICT (question_id, model_name) 
-                DO UPDATE SET
-                    answer = EXCLUDED.answer,
-                    quality_score = EXCLUDED.quality_score,
-                    response_time = EXCLUDED.response_time,
-                    created_at = CURRENT_TIMESTAMP
-                """)
-                
-                session.execute(insert_sql, {
+
+            # Insertar/actualizar resultados de todos los modelos en un solo
+            # executemany (la tabla multi_model_results ya existe desde init.sql)
+            insert_sql = text("""
+            INSERT INTO multi_model_results
+            (question_id, model_name, model_provider, answer, quality_score, response_time, cost_tier)
+            VALUES (:question_id, :model_name, :model_provider, :answer, :quality_score, :response_time, :cost_tier)
+            ON CONFLICT (question_id, model_name)
+            DO UPDATE SET
+                answer = EXCLUDED.answer,
+                quality_score = EXCLUDED.quality_score,
+                response_time = EXCLUDED.response_time,
+                created_at = CURRENT_TIMESTAMP
+            """)
+
+            params = [
+                {
                     'question_id': question_id,
                     'model_name': model,
                     'model_provider': result["provider"],
@@ -377,8 +774,11 @@ class ExperimentRunner:
                     'quality_score': result["quality_score"],
                     'response_time': result["metadata"]["response_time"],
                     'cost_tier': result["cost_tier"]
-                })
-            
+                }
+                for model, result in results.items()
+            ]
+            session.execute(insert_sql, params)
+
             session.commit()
             logger.debug(f"Guardados resultados multi-modelo para pregunta {question_id}")
             
@@ -390,112 +790,22 @@ class ExperimentRunner:
             if 'session' in locals():
                 session.close()
     
-    def _generate_charts(self):
+    async def _generate_charts(self):
         """
         Genera visualizaciones comparativas de métricas de cache.
-        
-        Crea un dashboard con 6 gráficos diferentes:
-        - Hit Rate por política y tamaño
-        - Distribución de Miss Rate 
-        - Mapa de calor de evictions
-        - Rendimiento por tamaño de cache
-        - Distribución de tiempos de respuesta
-        - Correlación Hit Rate vs Rendimiento
+
+        El renderizado (seaborn + dos savefig) tarda segundos y bloquearía el
+        event loop si corriera inline; se delega a un proceso worker para que
+        además la memoria de matplotlib se libere al terminar el proceso.
         """
-        logger.info("Generando gráficos comparativos...")
-        
         if not self.results:
             logger.warning("No hay resultados para generar gráficos")
             return
-        
-        # Configuración de estilo visual
-        plt.style.use('seaborn-v0_8')
-        sns.set_palette("husl")
-        
-        # Transformar resultados a DataFrame para análisis
-        data = []
-        for config, metrics in self.results.items():
-            policy, size = config.split('_size_')
-            # Calcular queries per second basado en métricas disponibles
-            runtime = metrics.get('runtime_seconds', 1)
-            total_ops = metrics.get('total_operations', 0)
-            qps = total_ops / runtime if runtime > 0 else 0
-            
-            data.append({
-                'Política': policy,
-                'Tamaño': int(size),
-                'Hit Rate (%)': metrics['hit_rate_percent'],
-                'Miss Rate (%)': metrics['miss_rate_percent'],
-                'Evictions': metrics['evictions'],
-                'Queries/sec': qps,
-                'Tiempo Promedio (ms)': (metrics['avg_hit_time_ms'] + metrics['avg_miss_time_ms']) / 2
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # Crear dashboard con múltiples visualizaciones
-        fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-        fig.suptitle('Análisis Comparativo de Políticas de Cache', fontsize=16, fontweight='bold')
-        
-        # 1. Hit Rate por Política y Tamaño
-        sns.barplot(data=df, x='Tamaño', y='Hit Rate (%)', hue='Política', ax=axes[0,0])
-        axes[0,0].set_title('Hit Rate por Política y Tamaño')
-        axes[0,0].set_ylabel('Hit Rate (%)')
-        
-        # 2. Miss Rate por Política
-        sns.boxplot(data=df, x='Política', y='Miss Rate (%)', ax=axes[0,1])
-        axes[0,1].set_title('Distribución de Miss Rate por Política')
-        axes[0,1].set_ylabel('Miss Rate (%)')
-        
-        # 3. Evictions por Configuración
-        pivot_evictions = df.pivot(index='Tamaño', columns='Política', values='Evictions')
-        sns.heatmap(pivot_evictions, annot=True, fmt='d', cmap='YlOrRd', ax=axes[0,2])
-        axes[0,2].set_title('Evictions por Política y Tamaño')
-        
-        # 4. Rendimiento (Queries/sec)
-        sns.lineplot(data=df, x='Tamaño', y='Queries/sec', hue='Política', marker='o', ax=axes[1,0])
-        axes[1,0].set_title('Rendimiento por Tamaño de Cache')
-        axes[1,0].set_ylabel('Consultas por segundo')
-        
-        # 5. Tiempo de Respuesta
-        sns.violinplot(data=df, x='Política', y='Tiempo Promedio (ms)', ax=axes[1,1])
-        axes[1,1].set_title('Distribución de Tiempo de Respuesta')
-        axes[1,1].set_ylabel('Tiempo Promedio (ms)')
-        
-        # 6. Comparación Hit Rate vs Rendimiento (tamaño como variable visual)
-        for policy in df['Política'].unique():
-            policy_data = df[df['Política'] == policy]
-            axes[1,2].scatter(policy_data['Hit Rate (%)'], policy_data['Queries/sec'], 
-                            label=policy, s=policy_data['Tamaño']/10, alpha=0.7)
-        axes[1,2].set_xlabel('Hit Rate (%)')
-        axes[1,2].set_ylabel('Queries/sec')
-        axes[1,2].set_title('Hit Rate vs Rendimiento\n(tamaño de punto = tamaño cache)')
-        axes[1,2].legend()
-        
-        plt.tight_layout()
-        
-        # Guardar dashboard principal
-        import os
-        os.makedirs('results', exist_ok=True)
-        plt.savefig('results/cache_analysis_charts.png', dpi=300, bbox_inches='tight')
-        logger.info("Gráficos guardados en: results/cache_analysis_charts.png")
-        
-        # Generar gráfico específico de Hit Rate
-        plt.figure(figsize=(12, 8))
-        pivot_hit = df.pivot(index='Tamaño', columns='Política', values='Hit Rate (%)')
-        pivot_hit.plot(kind='bar', width=0.8)
-        plt.title('Comparación de Hit Rate por Política de Cache', fontsize=14, fontweight='bold')
-        plt.xlabel('Tamaño de Cache')
-        plt.ylabel('Hit Rate (%)')
-        plt.legend(title='Política')
-        plt.xticks(rotation=0)
-        plt.grid(axis='y', alpha=0.3)
-        plt.tight_layout()
-        plt.savefig('results/hit_rate_comparison.png', dpi=300, bbox_inches='tight')
-        logger.info("Gráfico de Hit Rate guardado en: results/hit_rate_comparison.png")
-        
-        # Liberar memoria de matplotlib
-        plt.close('all')
+
+        logger.info("Generando gráficos comparativos en proceso aparte...")
+        loop = asyncio.get_running_loop()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+            await loop.run_in_executor(pool, _render_charts, self.results, 'results')
 
     def _generate_comparison_report(self):
         """
@@ -505,69 +815,68 @@ class ExperimentRunner:
         basadas en los resultados obtenidos.
         """
         logger.info("Generando reporte comparativo...")
-        
-        report_lines = [
-            "=== ANÁLISIS COMPARATIVO DE POLÍTICAS DE CACHE ===",
-            f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            "",
-            "CONFIGURACIONES PROBADAS:",
-            "- Políticas: LRU, TTL, TTL-LRU",
-            "- Tamaños de cache: 10, 100, 500, 1000, 2000 entradas",
-            "- Consultas reales: 13,000 consultas randomizadas de la base de datos",
-            "- Tipo de análisis: Consultas reales con selección aleatoria",
-            "",
-            "RESULTADOS DETALLADOS:",
-            "-" * 60
-        ]
-        
+
+        # Buffer de texto incremental: escribe bloques f-string multilinea
+        # directamente en vez de acumular una lista y unirla al final
+        buf = io.StringIO()
+        buf.write(f"""=== ANÁLISIS COMPARATIVO DE POLÍTICAS DE CACHE ===
+Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+CONFIGURACIONES PROBADAS:
+- Políticas: LRU, TTL, TTL-LRU
+- Tamaños de cache: 10, 100, 500, 1000, 2000 entradas
+- Consultas reales: 13,000 consultas randomizadas de la base de datos
+- Tipo de análisis: Consultas reales con selección aleatoria
+
+RESULTADOS DETALLADOS:
+{'-' * 60}""")
+
         # Organizar resultados por política
         policies = ['LRU', 'TTL', 'TTL-LRU']
         cache_sizes = [10, 100, 500, 1000, 2000]
-        
+
         for policy in policies:
-            report_lines.append(f"\nPOLÍTICA {policy}:")
-            report_lines.append("-" * 30)
-            
+            buf.write(f"\n\nPOLÍTICA {policy}:\n{'-' * 30}")
+
             for size in cache_sizes:
                 test_name = f"{policy}_size_{size}"
                 if test_name in self.results:
                     metrics = self.results[test_name]
-                    
-                    report_lines.extend([
-                        f"  Tamaño {size}:",
-                        f"    Hit Rate: {metrics['hit_rate_percent']:.2f}%",
-                        f"    Miss Rate: {metrics['miss_rate_percent']:.2f}%",
-                        f"    Evictions: {metrics['evictions']}",
-                        f"    Tiempo promedio hit: {metrics['avg_hit_time_ms']:.2f}ms",
-                        f"    Tiempo promedio miss: {metrics['avg_miss_time_ms']:.2f}ms",
-                        f"    Eficiencia cache: {metrics['cache_efficiency']:.2f}%",
-                        ""
-                    ])
-        
+
+                    buf.write(f"""
+  Tamaño {size}:
+    Hit Rate: {metrics['hit_rate_percent']:.2f}%
+    Miss Rate: {metrics['miss_rate_percent']:.2f}%
+    Evictions: {metrics['evictions']}
+    Tiempo promedio hit: {metrics['avg_hit_time_ms']:.2f}ms
+    Tiempo promedio miss: {metrics['avg_miss_time_ms']:.2f}ms
+    Eficiencia cache: {metrics['cache_efficiency']:.2f}%
+""")
+
         # Análisis comparativo
-        report_lines.extend([
-            "\nANÁLISIS COMPARATIVO:",
-            "-" * 30,
-            self._analyze_best_performers(),
-            "",
-            "CONCLUSIONES:",
-            "- Análisis basado en 13,000 consultas randomizadas de la base de datos",
-            "- Mayor tamaño de cache generalmente mejora hit rate",
-            "- Política TTL-LRU balancea tiempo y espacio eficientemente", 
-            "- LRU puro excelente para datos con acceso secuencial",
-            "- TTL puro útil para controlar memoria de forma estricta"
-        ])
-        
+        buf.write(f"""
+ANÁLISIS COMPARATIVO:
+{'-' * 30}
+{self._analyze_best_performers()}
+
+CONCLUSIONES:
+- Análisis basado en 13,000 consultas randomizadas de la base de datos
+- Mayor tamaño de cache generalmente mejora hit rate
+- Política TTL-LRU balancea tiempo y espacio eficientemente
+- LRU puro excelente para datos con acceso secuencial
+- TTL puro útil para controlar memoria de forma estricta""")
+
+        report_text = buf.getvalue()
+
         # Guardar reporte
-        import os
         os.makedirs('results', exist_ok=True)
         with open('results/cache_analysis_report.txt', 'w', encoding='utf-8') as f:
-            f.write('\n'.join(report_lines))
-        
+            f.write(report_text)
+
         logger.info("Reporte guardado en: results/cache_analysis_report.txt")
-        
+
         # Mostrar resumen en logs
-        for line in report_lines[:20]:  # Primeras 20 líneas
+        for line in report_text.splitlines()[:20]:  # Primeras 20 líneas
             logger.info(line)
     
     def _analyze_best_performers(self):
@@ -580,14 +889,21 @@ class ExperimentRunner:
         if not self.results:
             return "No hay resultados para analizar"
         
-        # Determinar mejor hit rate
-        best_hit_rate = max(self.results.items(), key=lambda x: x[1]['hit_rate_percent'])
-        
-        # Determinar configuración con menores evictions
-        best_evictions = min(self.results.items(), key=lambda x: x[1]['evictions'])
-        
-        # Determinar mejor eficiencia general de cache
-        best_efficiency = max(self.results.items(), key=lambda x: x[1]['cache_efficiency'])
+        # Un solo recorrido de los resultados: las tres métricas se cargan en
+        # arrays y se resuelven con argmax/argmin en vez de tres max()/min()
+        # con lambdas
+        configs = list(self.results.keys())
+        count = len(configs)
+        hit_rates = np.fromiter(
+            (self.results[c]['hit_rate_percent'] for c in configs), dtype=np.float64, count=count)
+        evictions = np.fromiter(
+            (self.results[c]['evictions'] for c in configs), dtype=np.int64, count=count)
+        efficiencies = np.fromiter(
+            (self.results[c]['cache_efficiency'] for c in configs), dtype=np.float64, count=count)
+
+        best_hit_rate = (configs[int(hit_rates.argmax())], self.results[configs[int(hit_rates.argmax())]])
+        best_evictions = (configs[int(evictions.argmin())], self.results[configs[int(evictions.argmin())]])
+        best_efficiency = (configs[int(efficiencies.argmax())], self.results[configs[int(efficiencies.argmax())]])
         
         return f"""
 Mejor Hit Rate: {best_hit_rate[0]} ({best_hit_rate[1]['hit_rate_percent']:.2f}%)
@@ -596,6 +912,182 @@ Mejor Eficiencia: {best_efficiency[0]} ({best_efficiency[1]['cache_efficiency']:
         """.strip()
 
 
+def _run_cache_config(policy: str, cache_size: int, db_index: int,
+                      indices: List[int], titles: List[str],
+                      contents: List[str], cache_payloads: List[CacheEntry]) -> Dict:
+    """
+    Ejecuta una configuración de cache completa en un proceso worker.
+
+    Función de módulo (picklable) para ProcessPoolExecutor. Cada worker usa
+    una base lógica de Redis distinta (db_index) para que dbsize()/keys()/
+    flushdb() de una configuración no interfieran con las demás corriendo
+    en paralelo.
+
+    Args:
+        policy: Política de cache (LRU, TTL, TTL-LRU)
+        cache_size: Tamaño máximo del cache
+        db_index: Base lógica de Redis asignada a esta configuración
+        indices: Traza de accesos compartida (índices sobre las columnas)
+        titles/contents/cache_payloads: Columnas de preguntas compartidas
+
+    Returns:
+        Dict: Métricas detalladas de la configuración (get_detailed_metrics)
+    """
+    async def _replay():
+        cache_manager = CacheManager(policy=policy, cache_size=cache_size, db_index=db_index)
+        await cache_manager.clear_cache()
+
+        cm_get = cache_manager.get
+        cm_set = cache_manager.set
+        for j in indices:
+            title = titles[j]
+            content = contents[j] or ''
+            if await cm_get(title, content) is None:
+                await cm_set(title, content, cache_payloads[j])
+
+        metrics = await cache_manager.get_detailed_metrics()
+        await cache_manager.clear_cache()
+        return metrics
+
+    # El cliente de cache es asíncrono; cada worker corre su propio loop
+    return asyncio.run(_replay())
+
+
+def _render_charts(results: Dict, out_dir: str = 'results'):
+    """
+    Renderiza el dashboard de cache y el gráfico de Hit Rate a PNG.
+
+    Función de módulo (no método) para que sea picklable y pueda ejecutarse
+    en un ProcessPoolExecutor sin arrastrar el ExperimentRunner completo.
+
+    Crea un dashboard con 6 gráficos diferentes:
+    - Hit Rate por política y tamaño
+    - Distribución de Miss Rate
+    - Mapa de calor de evictions
+    - Rendimiento por tamaño de cache
+    - Distribución de tiempos de respuesta
+    - Correlación Hit Rate vs Rendimiento
+
+    Args:
+        results: Resultados por configuración (salida de get_detailed_metrics)
+        out_dir: Directorio donde escribir los PNG
+    """
+    # Import perezoso: pandas/matplotlib/seaborn cuestan cientos de ms y
+    # decenas de MB al importar, y solo se necesitan al graficar
+    import matplotlib
+    matplotlib.use('Agg')  # Configuración para generar gráficos sin interfaz gráfica
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    # Configuración de estilo visual
+    plt.style.use('seaborn-v0_8')
+    sns.set_palette("husl")
+
+    # Transformar resultados a DataFrame en formato columnar (SoA):
+    # pandas construye columnas tipadas de una vez en lugar de inferir
+    # tipos fila por fila desde una lista de dicts
+    policies_col = []
+    sizes_col = []
+    hit_rates_col = []
+    miss_rates_col = []
+    evictions_col = []
+    runtimes_col = []
+    total_ops_col = []
+    avg_times_col = []
+    for config, metrics in results.items():
+        policy, size = config.split('_size_')
+        policies_col.append(policy)
+        sizes_col.append(int(size))
+        hit_rates_col.append(metrics['hit_rate_percent'])
+        miss_rates_col.append(metrics['miss_rate_percent'])
+        evictions_col.append(metrics['evictions'])
+        runtimes_col.append(metrics.get('runtime_seconds', 1))
+        total_ops_col.append(metrics.get('total_operations', 0))
+        avg_times_col.append((metrics['avg_hit_time_ms'] + metrics['avg_miss_time_ms']) / 2)
+
+    # Queries per second vectorizado, evitando división por cero
+    runtimes_arr = np.asarray(runtimes_col, dtype=np.float64)
+    total_ops_arr = np.asarray(total_ops_col, dtype=np.float64)
+    qps_arr = np.where(runtimes_arr > 0, total_ops_arr / np.maximum(runtimes_arr, 1e-9), 0.0)
+
+    df = pd.DataFrame({
+        'Política': policies_col,
+        'Tamaño': np.array(sizes_col, dtype=np.int32),
+        'Hit Rate (%)': np.array(hit_rates_col, dtype=np.float64),
+        'Miss Rate (%)': np.array(miss_rates_col, dtype=np.float64),
+        'Evictions': np.array(evictions_col, dtype=np.int64),
+        'Queries/sec': qps_arr,
+        'Tiempo Promedio (ms)': np.array(avg_times_col, dtype=np.float64)
+    })
+
+    # Crear dashboard con múltiples visualizaciones
+    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
+    fig.suptitle('Análisis Comparativo de Políticas de Cache', fontsize=16, fontweight='bold')
+
+    # 1. Hit Rate por Política y Tamaño
+    sns.barplot(data=df, x='Tamaño', y='Hit Rate (%)', hue='Política', ax=axes[0,0])
+    axes[0,0].set_title('Hit Rate por Política y Tamaño')
+    axes[0,0].set_ylabel('Hit Rate (%)')
+
+    # 2. Miss Rate por Política
+    sns.boxplot(data=df, x='Política', y='Miss Rate (%)', ax=axes[0,1])
+    axes[0,1].set_title('Distribución de Miss Rate por Política')
+    axes[0,1].set_ylabel('Miss Rate (%)')
+
+    # 3. Evictions por Configuración
+    pivot_evictions = df.pivot(index='Tamaño', columns='Política', values='Evictions')
+    sns.heatmap(pivot_evictions, annot=True, fmt='d', cmap='YlOrRd', ax=axes[0,2])
+    axes[0,2].set_title('Evictions por Política y Tamaño')
+
+    # 4. Rendimiento (Queries/sec)
+    sns.lineplot(data=df, x='Tamaño', y='Queries/sec', hue='Política', marker='o', ax=axes[1,0])
+    axes[1,0].set_title('Rendimiento por Tamaño de Cache')
+    axes[1,0].set_ylabel('Consultas por segundo')
+
+    # 5. Tiempo de Respuesta
+    sns.violinplot(data=df, x='Política', y='Tiempo Promedio (ms)', ax=axes[1,1])
+    axes[1,1].set_title('Distribución de Tiempo de Respuesta')
+    axes[1,1].set_ylabel('Tiempo Promedio (ms)')
+
+    # 6. Comparación Hit Rate vs Rendimiento (tamaño como variable visual)
+    for policy in df['Política'].unique():
+        policy_data = df[df['Política'] == policy]
+        axes[1,2].scatter(policy_data['Hit Rate (%)'], policy_data['Queries/sec'],
+                        label=policy, s=policy_data['Tamaño']/10, alpha=0.7)
+    axes[1,2].set_xlabel('Hit Rate (%)')
+    axes[1,2].set_ylabel('Queries/sec')
+    axes[1,2].set_title('Hit Rate vs Rendimiento\n(tamaño de punto = tamaño cache)')
+    axes[1,2].legend()
+
+    plt.tight_layout()
+
+    # Guardar dashboard principal (dpi 150: mitad de tiempo de encode y de
+    # tamaño de archivo, suficiente para revisión en pantalla)
+    os.makedirs(out_dir, exist_ok=True)
+    dashboard_path = os.path.join(out_dir, 'cache_analysis_charts.png')
+    plt.savefig(dashboard_path, dpi=150, bbox_inches='tight')
+    logger.info(f"Gráficos guardados en: {dashboard_path}")
+
+    # Generar gráfico específico de Hit Rate
+    plt.figure(figsize=(12, 8))
+    pivot_hit = df.pivot(index='Tamaño', columns='Política', values='Hit Rate (%)')
+    pivot_hit.plot(kind='bar', width=0.8)
+    plt.title('Comparación de Hit Rate por Política de Cache', fontsize=14, fontweight='bold')
+    plt.xlabel('Tamaño de Cache')
+    plt.ylabel('Hit Rate (%)')
+    plt.legend(title='Política')
+    plt.xticks(rotation=0)
+    plt.grid(axis='y', alpha=0.3)
+    plt.tight_layout()
+    hit_rate_path = os.path.join(out_dir, 'hit_rate_comparison.png')
+    plt.savefig(hit_rate_path, dpi=150, bbox_inches='tight')
+    logger.info(f"Gráfico de Hit Rate guardado en: {hit_rate_path}")
+
+    # Liberar memoria de matplotlib
+    plt.close('all')
+
+
 async def main(num_requests: int = None, use_multi_llm: bool = False):
     """
     Función principal del analizador de cache con integración LLM.
@@ -671,71 +1163,78 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
-    # Configuración del sistema de logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler('/app/results/llm_analysis.log')
-        ]
+    # Configuración del sistema de logging.
+    # Los handlers reales (consola + archivo) viven detrás de un QueueListener
+    # en un thread propio, así el formateo y la escritura a disco nunca
+    # bloquean el event loop del analizador.
+    import atexit
+    import queue
+    from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+
+    log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(log_formatter)
+    file_handler = logging.FileHandler('/app/results/llm_analysis.log')
+    file_handler.setFormatter(log_formatter)
+
+    # El archivo recibe escrituras en bloques de 1000 registros (o ante un
+    # ERROR) en vez de un write+flush por línea; atexit garantiza que el
+    # buffer residual llegue a disco
+    buffered_file_handler = MemoryHandler(
+        capacity=1000, flushLevel=logging.ERROR, target=file_handler
     )
+    atexit.register(buffered_file_handler.close)
+
+    log_queue = queue.Queue(-1)
+    logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)])
+    log_listener = QueueListener(log_queue, stream_handler, buffered_file_handler)
+    log_listener.start()
     
     # Configurar parámetros basados en argumentos y modos de velocidad
     num_requests = args.requests
     use_multi_llm = args.multi_llm
     
-    # Configurar modos de velocidad para 10K+ requisito
-    if args.test:
-        num_requests = 20
-        use_multi_llm = True
-        logger.info("🧪 MODO TEST: 20 solicitudes con Dummy-LLM")
-    elif args.ultra_fast:
-        num_requests = 1000
-        use_multi_llm = True
-        logger.info("🚀 MODO ULTRA-RÁPIDO: 1000 solicitudes (solo para pruebas)")
-    elif args.fast:
-        num_requests = 5000
-        use_multi_llm = True
-        logger.info("⚡ MODO RÁPIDO: 5000 solicitudes con Dummy-LLM optimizado")
-    elif args.standard:
-        num_requests = 10000
-        use_multi_llm = True
-        logger.info("📊 MODO ESTÁNDAR: 10,000 solicitudes (requisito mínimo cumplido)")
-    elif args.full:
-        num_requests = 15000
-        use_multi_llm = True
-        logger.info("🔥 MODO COMPLETO: 15,000 solicitudes con análisis exhaustivo")
-    elif args.cache_only:
-        num_requests = args.requests or 12000
-        use_multi_llm = False
-        logger.info(f"💨 MODO SOLO-CACHE: {num_requests} solicitudes SIN procesamiento LLM (máxima velocidad para 10K+)")
-    elif not args.requests:
-        # Default para cumplir requisito
-        num_requests = 10000
-        use_multi_llm = True
-        logger.info("📊 MODO DEFAULT: 10,000 solicitudes (requisito cumplido)")
-    
+    # Modos de velocidad para 10K+ requisito: tabla de despacho en vez de
+    # una escalera if/elif, así agregar un modo es una línea y el mensaje
+    # vive junto a sus parámetros
+    speed_modes = {
+        'test': (20, True, "🧪 MODO TEST: 20 solicitudes con Dummy-LLM"),
+        'ultra_fast': (1000, True, "🚀 MODO ULTRA-RÁPIDO: 1000 solicitudes (solo para pruebas)"),
+        'fast': (5000, True, "⚡ MODO RÁPIDO: 5000 solicitudes con Dummy-LLM optimizado"),
+        'standard': (10000, True, "📊 MODO ESTÁNDAR: 10,000 solicitudes (requisito mínimo cumplido)"),
+        'full': (15000, True, "🔥 MODO COMPLETO: 15,000 solicitudes con análisis exhaustivo"),
+        'cache_only': (args.requests or 12000, False,
+                       f"💨 MODO SOLO-CACHE: {args.requests or 12000} solicitudes SIN procesamiento LLM (máxima velocidad para 10K+)"),
+    }
+    for flag, (mode_requests, mode_multi_llm, mode_msg) in speed_modes.items():
+        if getattr(args, flag):
+            num_requests = mode_requests
+            use_multi_llm = mode_multi_llm
+            logger.info(mode_msg)
+            break
+    else:
+        if not args.requests:
+            # Default para cumplir requisito
+            num_requests = 10000
+            use_multi_llm = True
+            logger.info("📊 MODO DEFAULT: 10,000 solicitudes (requisito cumplido)")
+
     # Información de configuración y estimaciones de tiempo
     if use_multi_llm:
         logger.info("🤖 Configuración: Dummy-LLM (GPT-4o-mini, GPT-4o, Mistral-Nemo simulados)")
     else:
         logger.info("� Configuración: Solo análisis de cache (sin LLM)")
-        
+
     if num_requests:
-        # Estimaciones de tiempo optimizadas para 10K+
+        # Estimaciones de tiempo optimizadas para 10K+ (bisect sobre los
+        # umbrales en vez de otra escalera if/elif)
         if args.cache_only:
             tiempo_est = "5-8 minutos" if num_requests >= 10000 else "3-5 minutos"
-        elif num_requests <= 1000:
-            tiempo_est = "3-5 minutos"
-        elif num_requests <= 5000:
-            tiempo_est = "8-15 minutos"
-        elif num_requests <= 10000:
-            tiempo_est = "15-25 minutos"
-        elif num_requests <= 15000:
-            tiempo_est = "25-35 minutos"
         else:
-            tiempo_est = "30-45 minutos"
+            import bisect
+            estimates = ("3-5 minutos", "8-15 minutos", "15-25 minutos",
+                         "25-35 minutos", "30-45 minutos")
+            tiempo_est = estimates[bisect.bisect_left([1000, 5000, 10000, 15000], num_requests)]
         
         logger.info(f"📊 Configuración: {num_requests:,} solicitudes - Tiempo estimado: {tiempo_est}")
         if num_requests >= 10000:
@@ -746,5 +1245,18 @@ if __name__ == "__main__":
     else:
         logger.info("📊 Procesando todas las solicitudes disponibles")
     
+    # uvloop reemplaza el event loop estándar por libuv (scheduler en C),
+    # reduciendo el overhead de los cientos de miles de await del análisis
+    try:
+        import uvloop
+        uvloop.install()
+        logger.info("Event loop uvloop instalado")
+    except ImportError:
+        logger.debug("uvloop no disponible; usando event loop estándar")
+
     # Ejecutar analizador principal
-    asyncio.run(main(num_requests=num_requests, use_multi_llm=use_multi_llm))
+    try:
+        asyncio.run(main(num_requests=num_requests, use_multi_llm=use_multi_llm))
+    finally:
+        # Drenar la cola de logs pendientes antes de terminar
+        log_listener.stop()
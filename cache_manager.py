@@ -1,23 +1,155 @@
-import json
+import asyncio
+import collections
+import dataclasses
+import functools
 import hashlib
 import logging
 import os
+import re
+import time
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
+import numpy as np
+import orjson
 import redis
+import redis.asyncio as aioredis
+import zstandard
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Compresor/descompresor reutilizables: crear un ZstdCompressor por operación
+# costaría más que la compresión misma en payloads chicos
+_ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=3)
+_ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+
+# Pools de conexiones compartidos por base lógica: cada redis.Redis con su
+# propio pool repite el setup TCP + SELECT por instancia, y CacheAnalyzer
+# construye varios managers en loop. Un pool por db_index amortiza las
+# conexiones entre instancias sin mezclar experimentos aislados por db.
+_REDIS_POOLS: Dict[int, aioredis.ConnectionPool] = {}
+
+
+def _get_shared_pool(db_index: int) -> aioredis.ConnectionPool:
+    """Obtener (o crear una sola vez) el pool async para una db lógica."""
+    pool = _REDIS_POOLS.get(db_index)
+    if pool is None:
+        pool = aioredis.ConnectionPool(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', '6379')),
+            db=db_index,
+            decode_responses=False,  # Valores binarios (orjson + zstd)
+            socket_connect_timeout=5,
+            socket_timeout=5,
+            socket_keepalive=True,   # Reusar la conexión TCP entre ráfagas
+            max_connections=64       # Pool acorde a la concurrencia LLM
+        )
+        _REDIS_POOLS[db_index] = pool
+    return pool
+
+
+@functools.lru_cache(maxsize=4096)
+def _cache_key_for(question_title: str, question_content: str) -> str:
+    """
+    Clave de cache memoizada por (título, contenido).
+
+    Un miss hace get() y luego set() sobre el mismo par, y los experimentos
+    repiten las mismas preguntas miles de veces: la memoización evita
+    re-hashear contenido de varios KB en cada operación. A nivel de módulo
+    (no de instancia) para que las 15 configuraciones compartan la tabla.
+    """
+    if question_content:
+        content = f"{question_title}|{question_content}".strip()
+    else:
+        # Caso dominante en el dataset: preguntas sin contenido adicional.
+        # Evita interpolar/strip-ear la cadena combinada; el resultado es
+        # idéntico porque "|" final impide que strip() toque la derecha.
+        content = question_title.lstrip() + "|"
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# datetimes naive como UTC y arrays NumPy sin conversión intermedia a lista
+_ORJSON_OPTS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+
+# Prefijo de un frame zstd; JSON nunca empieza con 0x28 ('('), así que el
+# primer byte distingue valores comprimidos de valores crudos sin metadata
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def _serialize_cache_value(data: Dict[str, Any]) -> bytes:
+    """
+    Serializar con orjson (maneja datetime nativo) y comprimir con zstd.
+
+    En payloads cortos el frame zstd puede salir MÁS grande que el JSON
+    original; en ese caso se almacena el JSON crudo y el lector lo
+    distingue por el magic number del frame.
+    """
+    raw = orjson.dumps(data, option=_ORJSON_OPTS)
+    blob = _ZSTD_COMPRESSOR.compress(raw)
+    return blob if len(blob) < len(raw) else raw
+
+
+def _deserialize_cache_value(blob: bytes) -> Dict[str, Any]:
+    """Descomprimir (si corresponde) y deserializar un valor de cache."""
+    if blob[:4] == _ZSTD_MAGIC:
+        blob = _ZSTD_DECOMPRESSOR.decompress(blob)
+    return orjson.loads(blob)
+
+
+# Ciclo de evicción completo en el servidor: mide el índice, elige el 10%
+# más viejo, borra las claves y las saca del índice, todo atómico y en un
+# solo round-trip. Devuelve {tamaño_antes, {víctimas...}} para que el
+# cliente actualice métricas y purgue su L1.
+_EVICT_LUA = """
+local index = KEYS[1]
+local max_size = tonumber(ARGV[1])
+local evict_pct = tonumber(ARGV[2])
+local size = redis.call('ZCARD', index)
+if size < max_size then
+    return {size, {}}
+end
+local count = math.max(1, math.floor(size * evict_pct))
+local victims = redis.call('ZRANGE', index, 0, count - 1)
+if #victims > 0 then
+    redis.call('DEL', unpack(victims))
+    redis.call('ZREM', index, unpack(victims))
+end
+return {size, victims}
+"""
+
 class CacheManager:
     """Sistema de cache con análisis de políticas LRU vs TTL"""
     
-    def __init__(self, policy='TTL-LRU', cache_size=1000):
+    def __init__(self, policy='TTL-LRU', cache_size=1000, db_index=0):
         self.redis_host = os.getenv('REDIS_HOST', 'localhost')
         self.redis_port = int(os.getenv('REDIS_PORT', '6379'))
         self.policy = policy  # TTL-LRU, LRU, TTL
         self.max_cache_size = cache_size
+        self.db_index = db_index  # Base lógica de Redis (aísla experimentos paralelos)
+        self.key_prefix = 'llmcache:'  # Namespacing: limpiar el cache no toca otras claves
+        self.lru_index_key = 'cache:lru'  # ZSET clave -> último acceso (índice de evicción)
         self.cache_ttl = int(os.getenv('CACHE_TTL', '3600'))
+
+        # Cache L1 en proceso (OrderedDict como LRU): un hit aquí es un
+        # lookup de dict en vez de un round-trip a Redis. Cada entrada
+        # guarda (valor, deadline) para no servir datos cuyo TTL en Redis ya
+        # venció, y los hits L1 acumulan "touches" que se propagan al índice
+        # de recencia en lotes — sin eso los hits más calientes serían
+        # invisibles para la evicción LRU y la comparación de políticas
+        # degeneraría en FIFO
+        self._l1 = collections.OrderedDict()
+        self._l1_max = min(2048, cache_size)
+        self._l1_touches = {}  # clave -> último acceso pendiente de propagar
+        self._touch_flush_threshold = 64
+        self._touch_task = None
+        self._redis_stats_cache = (0.0, None)  # (monotonic, (tamaño, memoria))
+
+        # Evicción en background: un chequeo cada ~1% de la capacidad en vez
+        # de uno por set(); a lo sumo una tarea de evicción viva a la vez
+        self._evict_check_interval = max(1, cache_size // 100)
+        self._sets_since_evict_check = 0
+        self._evict_task = None
         
         # Métricas detalladas por política
         self.metrics = {
@@ -29,84 +161,145 @@ class CacheManager:
             'policy_type': policy,
             'cache_size_limit': cache_size,
             'start_time': datetime.now(),
-            'hit_times': [],
-            'miss_times': [],
             'eviction_reasons': []
         }
+
+        # Medias móviles (Welford) de tiempos de hit/miss: dos floats por
+        # serie en vez de una lista que crece un float por operación y que
+        # luego habría que recorrer entera para promediar
+        self._hit_mean = 0.0
+        self._hit_m2 = 0.0
+        self._miss_mean = 0.0
+        self._miss_m2 = 0.0
         
         try:
-            self.redis_client = redis.Redis(
-                host=self.redis_host,
-                port=self.redis_port,
-                db=0,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5
-            )
-            self.redis_client.ping()
+            # Cliente asíncrono: las operaciones de cache se esperan con await
+            # y no bloquean el event loop mientras Redis responde. La conexión
+            # se abre perezosamente en el primer comando; los errores de
+            # conexión se manejan en cada operación. El pool se comparte entre
+            # todas las instancias que apuntan a la misma db lógica
+            self.redis_client = aioredis.Redis(connection_pool=_get_shared_pool(db_index))
+            # register_script cachea el SHA y reintenta el SCRIPT LOAD solo
+            # ante NOSCRIPT (p. ej. tras un reinicio del servidor)
+            self._evict_script = self.redis_client.register_script(_EVICT_LUA)
             logger.info(f"Cache iniciado: Política={policy}, Tamaño={cache_size}")
         except Exception as e:
             logger.error(f"Error conectando Redis: {e}")
             self.redis_client = None
     
     def _generate_key(self, question_title: str, question_content: str = "") -> str:
-        """Generar clave única para pregunta"""
-        content = f"{question_title}|{question_content}".strip()
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
-    
-    def get(self, question_title: str, question_content: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Generar clave única para pregunta.
+
+        blake2b en lugar de sha256: la clave no es criptográfica, solo
+        identifica la entrada, y blake2b es notablemente más rápido por byte
+        en CPython sin sumar dependencias. 128 bits bastan contra colisiones
+        y acortan la clave en Redis a la mitad. El trabajo real vive en
+        _cache_key_for, memoizado a nivel de módulo.
+        """
+        return self.key_prefix + _cache_key_for(question_title, question_content)
+
+    async def get(self, question_title: str, question_content: str = "") -> Optional[Dict[str, Any]]:
         """Buscar en cache con métricas detalladas"""
-        start_time = datetime.now()
+        # perf_counter_ns: contador entero sin asignar objetos datetime por
+        # operación (dos por get era el costo fijo más alto del camino L1)
+        start_ns = time.perf_counter_ns()
         self.metrics['total_operations'] += 1
         
         if not self.redis_client:
-            self._record_miss(start_time)
+            self._record_miss(start_ns)
             return None
             
         try:
             cache_key = self._generate_key(question_title, question_content)
-            cached_data = self.redis_client.get(cache_key)
-            
+
+            # L1: resolver en proceso sin tocar la red. El hit igual registra
+            # el acceso en el buffer de touches para que la recencia llegue
+            # al índice de evicción; una entrada vencida se descarta y cae a
+            # Redis (que también será miss)
+            value = self._l1_lookup(cache_key)
+            if value is not None:
+                self._record_hit(start_ns, cache_key)
+                return value
+
+            if 'LRU' in self.policy:
+                # GET + refresco de TTL + recencia en UN round-trip. EXPIRE
+                # sobre una clave inexistente es no-op, y ZADD con xx=True
+                # solo actualiza miembros ya presentes en el índice, así que
+                # el pipeline es seguro también cuando es miss
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.get(cache_key)
+                pipe.expire(cache_key, self.cache_ttl)
+                pipe.zadd(self.lru_index_key, {cache_key: time.time()}, xx=True)
+                cached_data = (await pipe.execute())[0]
+                deadline = time.monotonic() + self.cache_ttl
+            else:
+                # TTL pura: no se refresca la expiración, así que el deadline
+                # local debe copiar el TTL restante real (PTTL), no el nominal
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.get(cache_key)
+                pipe.pttl(cache_key)
+                cached_data, pttl = await pipe.execute()
+                deadline = (time.monotonic() + pttl / 1000.0) if pttl and pttl > 0 else None
+
             if cached_data:
-                self._record_hit(start_time, cache_key)
-                
-                # Actualizar acceso para política LRU
-                if 'LRU' in self.policy:
-                    self.redis_client.expire(cache_key, self.cache_ttl)
-                
-                return json.loads(cached_data)
+                self._record_hit(start_ns, cache_key)
+
+                value = _deserialize_cache_value(cached_data)
+                self._l1_store(cache_key, value, deadline)
+                return value
             else:
-                self._record_miss(start_time)
+                self._record_miss(start_ns)
                 return None
                 
         except Exception as e:
             logger.error(f"Error accediendo cache: {e}")
-            self._record_miss(start_time)
+            self._record_miss(start_ns)
             return None
     
-    def set(self, question_title: str, question_content: str, data: Dict[str, Any]) -> bool:
+    async def set(self, question_title: str, question_content: str, data: Dict[str, Any]) -> bool:
         """Almacenar con gestión de políticas"""
         if not self.redis_client:
             return False
             
         try:
             cache_key = self._generate_key(question_title, question_content)
-            data['cached_at'] = datetime.utcnow().isoformat()
-            data['policy'] = self.policy
-            
-            # Aplicar política de remoción antes de insertar
-            self._apply_eviction_policy()
-            
-            # Almacenar según política
-            if self.policy == 'TTL':
-                success = self.redis_client.setex(cache_key, self.cache_ttl, json.dumps(data))
-            elif self.policy == 'LRU':
-                success = self.redis_client.set(cache_key, json.dumps(data))
-            else:  # TTL-LRU
-                success = self.redis_client.setex(cache_key, self.cache_ttl, json.dumps(data))
-            
+            # Acepta dicts o dataclasses (p. ej. CacheEntry del analizador):
+            # orjson serializa ambos sin conversión intermedia.
+            # cached_at como epoch float: sin syscall de formateo ni string
+            # por escritura; quien reporte puede formatearlo al leer.
+            # Los sellos van en una copia: mutar el payload del caller era
+            # un efecto visible (los experimentos comparten payloads)
+            now = time.time()
+            if isinstance(data, dict):
+                data = {**data, 'cached_at': now, 'policy': self.policy}
+            else:
+                data = dataclasses.replace(data, cached_at=now, policy=self.policy)
+            
+            # Evicción fuera del camino crítico: en vez de un chequeo con
+            # ZCARD antes de cada escritura, se dispara una tarea
+            # fire-and-forget cada ~1% de la capacidad (rebose acotado) y el
+            # set se confirma sin esperar la limpieza
+            self._sets_since_evict_check += 1
+            if self._sets_since_evict_check >= self._evict_check_interval:
+                self._sets_since_evict_check = 0
+                if self._evict_task is None or self._evict_task.done():
+                    self._evict_task = asyncio.create_task(self._apply_eviction_policy())
+
+            # Almacenar según política (serializado una sola vez). El SETEX y
+            # la entrada en el índice ZSET viajan en un solo round-trip
+            blob = _serialize_cache_value(data)
+            pipe = self.redis_client.pipeline()
+            # SET con ex= cubre ambas políticas en un solo comando: ex=None
+            # para LRU pura (sin expiración), TTL para TTL y TTL-LRU
+            pipe.set(cache_key, blob, ex=(None if self.policy == 'LRU' else self.cache_ttl))
+            pipe.zadd(self.lru_index_key, {cache_key: time.time()})
+            success = (await pipe.execute())[0]
+
             if success:
                 self.metrics['sets'] += 1
+                deadline = None if self.policy == 'LRU' else time.monotonic() + self.cache_ttl
+                self._l1_store(cache_key, data, deadline)
                 logger.debug(f"Cache SET: {question_title[:50]}...")
                 return True
             
@@ -116,105 +309,288 @@ class CacheManager:
             logger.error(f"Error almacenando cache: {e}")
             return False
     
-    def _apply_eviction_policy(self):
-        """Aplicar política de remoción según configuración"""
+    async def get_many(self, pairs) -> list:
+        """
+        Buscar un lote de (título, contenido) en un solo round-trip.
+
+        Mil gets secuenciales son mil RTTs seriales; aquí todos los GET (y
+        el refresco de recencia para LRU) viajan en un pipeline. Devuelve
+        una lista alineada con pairs (None en cada miss).
+        """
+        if not self.redis_client:
+            for _ in pairs:
+                self._record_miss(time.perf_counter_ns())
+            return [None] * len(pairs)
+
+        start_ns = time.perf_counter_ns()
+        self.metrics['total_operations'] += len(pairs)
+        results = [None] * len(pairs)
+        pending = []  # (posición, cache_key) a resolver contra Redis
+
+        for idx, (title, content) in enumerate(pairs):
+            cache_key = self._generate_key(title, content)
+            value = self._l1_lookup(cache_key)
+            if value is not None:
+                self._record_hit(start_ns, cache_key)
+                results[idx] = value
+            else:
+                pending.append((idx, cache_key))
+
+        if not pending:
+            return results
+
         try:
-            current_size = self.redis_client.dbsize()
-            
-            if current_size >= self.max_cache_size:
-                keys = self.redis_client.keys('*')
-                
-                if len(keys) >= self.max_cache_size:
-                    evict_count = max(1, int(len(keys) * 0.1))  # Remover 10%
-                    
-                    if self.policy == 'LRU':
-                        # Política LRU: remover claves menos accedidas recientemente
-                        keys_with_access = []
-                        for key in keys:
-                            ttl = self.redis_client.ttl(key)
-                            keys_with_access.append((key, ttl))
-                        
-                        # Ordenar por TTL ascendente (menos recientes)
-                        keys_with_access.sort(key=lambda x: x[1])
-                        keys_to_remove = [k[0] for k in keys_with_access[:evict_count]]
-                        reason = 'LRU_POLICY'
-                        
-                    elif self.policy == 'TTL':
-                        # Política TTL: remover claves que expiran primero
-                        keys_with_ttl = []
-                        for key in keys:
-                            ttl = self.redis_client.ttl(key)
-                            if ttl > 0:
-                                keys_with_ttl.append((key, ttl))
-                        
-                        keys_with_ttl.sort(key=lambda x: x[1])
-                        keys_to_remove = [k[0] for k in keys_with_ttl[:evict_count]]
-                        reason = 'TTL_POLICY'
-                        
-                    else:  # TTL-LRU
-                        # Política combinada: TTL + LRU
-                        keys_with_score = []
-                        for key in keys:
-                            ttl = self.redis_client.ttl(key)
-                            # Score combinado: menor TTL + factor aleatorio para LRU
-                            score = ttl if ttl > 0 else 999999
-                            keys_with_score.append((key, score))
-                        
-                        keys_with_score.sort(key=lambda x: x[1])
-                        keys_to_remove = [k[0] for k in keys_with_score[:evict_count]]
-                        reason = 'TTL_LRU_POLICY'
-                    
-                    # Ejecutar remoción
-                    removed = 0
-                    for key in keys_to_remove:
-                        if self.redis_client.delete(key):
-                            removed += 1
-                    
-                    self.metrics['evictions'] += removed
-                    self.metrics['eviction_reasons'].append({
-                        'timestamp': datetime.now().isoformat(),
-                        'reason': reason,
-                        'count': removed,
-                        'cache_size_before': current_size
-                    })
-                    
-                    logger.info(f"Evicción {reason}: {removed} claves removidas")
-                    
+            refresh_lru = 'LRU' in self.policy
+            cmds_per_key = 3 if refresh_lru else 2
+            pipe = self.redis_client.pipeline(transaction=False)
+            now = time.time()
+            for _, cache_key in pending:
+                pipe.get(cache_key)
+                if refresh_lru:
+                    pipe.expire(cache_key, self.cache_ttl)
+                    pipe.zadd(self.lru_index_key, {cache_key: now}, xx=True)
+                else:
+                    # TTL pura: el deadline local copia el TTL restante real
+                    pipe.pttl(cache_key)
+            responses = await pipe.execute()
+
+            now_mono = time.monotonic()
+            for i, (idx, cache_key) in enumerate(pending):
+                cached_data = responses[i * cmds_per_key]
+                if cached_data:
+                    if refresh_lru:
+                        deadline = now_mono + self.cache_ttl
+                    else:
+                        pttl = responses[i * cmds_per_key + 1]
+                        deadline = (now_mono + pttl / 1000.0) if pttl and pttl > 0 else None
+                    value = _deserialize_cache_value(cached_data)
+                    self._l1_store(cache_key, value, deadline)
+                    self._record_hit(start_ns, cache_key)
+                    results[idx] = value
+                else:
+                    self._record_miss(start_ns)
+        except Exception as e:
+            logger.error(f"Error accediendo cache en lote: {e}")
+            for _ in pending:
+                self._record_miss(start_ns)
+
+        return results
+
+    async def set_many(self, triples) -> int:
+        """
+        Almacenar un lote de (título, contenido, data) en un solo round-trip.
+
+        Mismo contrato que set() repetido, pero todos los SET + ZADD se
+        encolan en un pipeline. Devuelve cuántas escrituras confirmó Redis.
+        """
+        if not self.redis_client or not triples:
+            return 0
+
+        try:
+            ttl = None if self.policy == 'LRU' else self.cache_ttl
+            now = time.time()
+            pipe = self.redis_client.pipeline(transaction=False)
+            keys_and_data = []
+            for title, content, data in triples:
+                cache_key = self._generate_key(title, content)
+                # Igual que set(): sellar sobre una copia, no sobre el
+                # payload del caller
+                if isinstance(data, dict):
+                    data = {**data, 'cached_at': now, 'policy': self.policy}
+                else:
+                    data = dataclasses.replace(data, cached_at=now, policy=self.policy)
+                pipe.set(cache_key, _serialize_cache_value(data), ex=ttl)
+                pipe.zadd(self.lru_index_key, {cache_key: now})
+                keys_and_data.append((cache_key, data))
+            responses = await pipe.execute()
+
+            stored = 0
+            deadline = None if ttl is None else time.monotonic() + ttl
+            for i, (cache_key, data) in enumerate(keys_and_data):
+                if responses[i * 2]:
+                    stored += 1
+                    self._l1_store(cache_key, data, deadline)
+            self.metrics['sets'] += stored
+
+            # Mismo disparador de evicción en background que set()
+            self._sets_since_evict_check += len(triples)
+            if self._sets_since_evict_check >= self._evict_check_interval:
+                self._sets_since_evict_check = 0
+                if self._evict_task is None or self._evict_task.done():
+                    self._evict_task = asyncio.create_task(self._apply_eviction_policy())
+
+            return stored
+        except Exception as e:
+            logger.error(f"Error almacenando cache en lote: {e}")
+            return 0
+
+    def _l1_store(self, cache_key: str, value, deadline=None) -> None:
+        """
+        Insertar en el L1 local desalojando la entrada más vieja si rebosa.
+
+        deadline es el instante monotónico en que vence el TTL de la clave
+        en Redis (None si no expira): el L1 nunca debe sobrevivir al TTL.
+        """
+        self._l1[cache_key] = (value, deadline)
+        self._l1.move_to_end(cache_key)
+        if len(self._l1) > self._l1_max:
+            self._l1.popitem(last=False)
+
+    def _l1_lookup(self, cache_key: str):
+        """
+        Resolver una clave contra el L1 aplicando TTL y registrando recencia.
+
+        Devuelve el valor, o None si no está o su TTL en Redis ya venció
+        (en cuyo caso se descarta la entrada local). En políticas con LRU el
+        acceso se anota en el buffer de touches para que los hits L1 sigan
+        actualizando el índice de evicción y el TTL en Redis.
+        """
+        entry = self._l1.get(cache_key)
+        if entry is None:
+            return None
+
+        value, deadline = entry
+        if deadline is not None and time.monotonic() > deadline:
+            del self._l1[cache_key]
+            return None
+
+        self._l1.move_to_end(cache_key)
+        if 'LRU' in self.policy:
+            # El EXPIRE viaja en el próximo flush; extender el deadline local
+            # acá mantiene ambos lados consistentes (ventana de segundos
+            # contra TTLs de una hora)
+            self._l1[cache_key] = (value, time.monotonic() + self.cache_ttl)
+            self._l1_touches[cache_key] = time.time()
+            if (len(self._l1_touches) >= self._touch_flush_threshold
+                    and (self._touch_task is None or self._touch_task.done())):
+                self._touch_task = asyncio.create_task(self._flush_l1_touches())
+        return value
+
+    async def _flush_l1_touches(self):
+        """
+        Propagar a Redis los accesos acumulados por hits del L1.
+
+        Un solo ZADD con el mapping completo refresca la recencia de todas
+        las claves tocadas, y los EXPIRE pipelinizados renuevan su TTL: el
+        costo de red se paga una vez por lote en vez de por hit.
+        """
+        if not self._l1_touches or not self.redis_client:
+            return
+        touches = self._l1_touches
+        self._l1_touches = {}
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zadd(self.lru_index_key, touches, xx=True)
+            for cache_key in touches:
+                pipe.expire(cache_key, self.cache_ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error propagando accesos L1 a Redis: {e}")
+
+    async def _apply_eviction_policy(self):
+        """
+        Aplicar política de remoción según configuración.
+
+        El índice ZSET cache:lru (clave -> último acceso) reemplaza al
+        barrido KEYS * + un TTL por clave: KEYS es O(N) y bloquea Redis
+        entero en cada set() cuando el cache crece. Con el ZSET, medir el
+        tamaño es ZCARD y elegir víctimas es un ZRANGE de los scores más
+        viejos; como LRU refresca el score en cada get() y TTL solo lo fija
+        al escribir, el mismo orden ascendente expresa ambas políticas.
+        """
+        try:
+            # Drenar los touches pendientes antes de elegir víctimas: la
+            # evicción debe ver la recencia real de los hits L1 aún no
+            # propagados o desalojaría justamente las claves más calientes
+            await self._flush_l1_touches()
+
+            # Todo el ciclo (medir, elegir víctimas, borrarlas y limpiar el
+            # índice) corre atómico en el servidor vía Lua: un solo
+            # round-trip y sin carrera entre el ZRANGE y el DEL
+            result = await self._evict_script(
+                keys=[self.lru_index_key],
+                args=[self.max_cache_size, 0.1]
+            )
+            if not result:
+                return
+            current_size, victims = result[0], result[1]
+            if not victims:
+                return
+
+            if self.policy == 'LRU':
+                reason = 'LRU_POLICY'
+            elif self.policy == 'TTL':
+                reason = 'TTL_POLICY'
+            else:
+                reason = 'TTL_LRU_POLICY'
+
+            # Mantener coherencia: lo que salió de Redis sale del L1. Con
+            # decode_responses=False las víctimas llegan siempre como bytes
+            for victim in victims:
+                self._l1.pop(victim.decode(), None)
+
+            removed = len(victims)
+            self.metrics['evictions'] += removed
+            self.metrics['eviction_reasons'].append({
+                'timestamp': datetime.now().isoformat(),
+                'reason': reason,
+                'count': removed,
+                'cache_size_before': current_size
+            })
+
+            logger.info(f"Evicción {reason}: {removed} claves removidas")
+
         except Exception as e:
             logger.error(f"Error aplicando política de evicción: {e}")
     
-    def _record_hit(self, start_time, cache_key):
+    def _record_hit(self, start_ns, cache_key):
         """Registrar cache hit con métricas"""
-        response_time = (datetime.now() - start_time).total_seconds() * 1000
+        response_time = (time.perf_counter_ns() - start_ns) * 1e-6
         self.metrics['hits'] += 1
-        self.metrics['hit_times'].append(response_time)
+        delta = response_time - self._hit_mean
+        self._hit_mean += delta / self.metrics['hits']
+        self._hit_m2 += delta * (response_time - self._hit_mean)
         logger.debug(f"CACHE HIT ({response_time:.2f}ms): {cache_key[:16]}...")
     
-    def _record_miss(self, start_time):
+    def _record_miss(self, start_ns):
         """Registrar cache miss con métricas"""
-        response_time = (datetime.now() - start_time).total_seconds() * 1000
+        response_time = (time.perf_counter_ns() - start_ns) * 1e-6
         self.metrics['misses'] += 1
-        self.metrics['miss_times'].append(response_time)
+        delta = response_time - self._miss_mean
+        self._miss_mean += delta / self.metrics['misses']
+        self._miss_m2 += delta * (response_time - self._miss_mean)
     
-    def get_detailed_metrics(self) -> Dict[str, Any]:
+    async def get_detailed_metrics(self) -> Dict[str, Any]:
         """Obtener métricas detalladas para análisis"""
         total_ops = self.metrics['total_operations']
         runtime = (datetime.now() - self.metrics['start_time']).total_seconds()
         
-        # Calcular estadísticas de tiempo
-        avg_hit_time = sum(self.metrics['hit_times']) / len(self.metrics['hit_times']) if self.metrics['hit_times'] else 0
-        avg_miss_time = sum(self.metrics['miss_times']) / len(self.metrics['miss_times']) if self.metrics['miss_times'] else 0
+        # Las medias ya vienen acumuladas (Welford): lectura O(1)
+        avg_hit_time = self._hit_mean
+        avg_miss_time = self._miss_mean
         
-        # Información actual del cache
+        # Información actual del cache. ZCARD + INFO son dos round-trips
+        # que no cambian entre lecturas consecutivas del reporte: se
+        # memoizan con un TTL de 2 segundos
         current_size = 0
         memory_usage = 0
         if self.redis_client:
-            try:
-                current_size = self.redis_client.dbsize()
-                info = self.redis_client.info('memory')
-                memory_usage = info.get('used_memory', 0)
-            except:
-                pass
+            now_mono = time.monotonic()
+            stamp, cached = self._redis_stats_cache
+            if cached is not None and now_mono - stamp < 2.0:
+                current_size, memory_usage = cached
+            else:
+                try:
+                    # ZCARD + INFO en un solo round-trip al refrescar; INFO
+                    # es un comando pesado en un servidor cargado
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    pipe.zcard(self.lru_index_key)
+                    pipe.info('memory')
+                    current_size, info = await pipe.execute()
+                    memory_usage = info.get('used_memory', 0)
+                except:
+                    pass
+                self._redis_stats_cache = (now_mono, (current_size, memory_usage))
         
         return {
             # Métricas básicas
@@ -261,30 +637,115 @@ class CacheManager:
             'policy_type': policy,
             'cache_size_limit': cache_size,
             'start_time': datetime.now(),
-            'hit_times': [],
-            'miss_times': [],
             'eviction_reasons': []
         }
+        self._hit_mean = 0.0
+        self._hit_m2 = 0.0
+        self._miss_mean = 0.0
+        self._miss_m2 = 0.0
         logger.info(f"Métricas reiniciadas para política {policy}")
     
-    def clear_cache(self):
-        """Limpiar cache completamente"""
+    async def clear_cache(self):
+        """
+        Limpiar cache completamente.
+
+        FLUSHDB es bloqueante en el servidor Redis (mono-hilo): en un Redis
+        compartido congelaría al resto de los clientes mientras borra. En su
+        lugar se recorren solo las claves de este cache (por prefijo) con
+        SCAN incremental y se liberan con UNLINK, que reclama la memoria en
+        un hilo aparte del servidor.
+        """
         if self.redis_client:
             try:
-                self.redis_client.flushdb()
+                self._l1.clear()
+                self._l1_touches.clear()
+                cursor = 0
+                while True:
+                    cursor, batch = await self.redis_client.scan(
+                        cursor, match=f"{self.key_prefix}*", count=1000
+                    )
+                    if batch:
+                        await self.redis_client.unlink(*batch)
+                    if cursor == 0:
+                        break
+                await self.redis_client.unlink(self.lru_index_key)
                 self.reset_metrics()
                 logger.info("Cache limpiado completamente")
             except Exception as e:
                 logger.error(f"Error limpiando cache: {e}")
 
 
+class SemanticCache:
+    """
+    Cache semántico de casi-duplicados basado en similitud coseno.
+
+    Segunda capa detrás del cache exacto: preguntas parafraseadas
+    ("¿Qué es X?" / "Háblame de X") comparten resultado cuando la similitud
+    coseno de sus vectores supera el umbral configurado. Sin dependencias
+    externas: usa un embedding bag-of-words con hashing trick sobre NumPy
+    en lugar de un modelo de sentence-transformers.
+    """
+
+    def __init__(self, dimensions: int = 384, similarity_threshold: float = 0.92):
+        self.dimensions = dimensions
+        self.similarity_threshold = similarity_threshold
+        # Matriz preallocada con crecimiento geométrico: vstack por inserción
+        # recopiaba la matriz entera cada vez (O(N²·dim) acumulado); duplicar
+        # capacidad al llenarse amortiza la copia a O(N·dim)
+        self._capacity = 256
+        self._vectors = np.empty((self._capacity, dimensions), dtype=np.float32)
+        self._results = []
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Vectoriza el texto con hashing trick y normalización L2 (norma=1)."""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.casefold()):
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def get(self, question_title: str, question_content: str = "") -> Optional[Any]:
+        """Buscar el resultado más similar; None si no supera el umbral."""
+        if not self._results:
+            return None
+        vector = self._embed(f"{question_title} {question_content[:512]}")
+        # Con vectores normalizados el producto interno equivale al coseno;
+        # solo las filas ocupadas participan del producto
+        scores = self._vectors[:len(self._results)] @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            logger.debug(f"Semantic cache HIT (similitud={scores[best]:.3f})")
+            return self._results[best]
+        return None
+
+    def add(self, question_title: str, question_content: str, result: Any):
+        """Almacenar el vector de la pregunta junto a su resultado."""
+        vector = self._embed(f"{question_title} {question_content[:512]}")
+        count = len(self._results)
+        if count == self._capacity:
+            self._capacity *= 2
+            grown = np.empty((self._capacity, self.dimensions), dtype=np.float32)
+            grown[:count] = self._vectors[:count]
+            self._vectors = grown
+        self._vectors[count] = vector
+        self._results.append(result)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
 class CacheAnalyzer:
     """Analizador comparativo de políticas de cache"""
     
     def __init__(self):
         self.results = {}
         
-    def compare_policies(self, cache_sizes=[500, 1000, 2000], policies=['LRU', 'TTL', 'TTL-LRU']):
+    async def compare_policies(self, cache_sizes=[500, 1000, 2000], policies=['LRU', 'TTL', 'TTL-LRU']):
         """Comparar diferentes políticas y tamaños de cache"""
         logger.info("Iniciando análisis comparativo de políticas de cache")
         
@@ -294,21 +755,22 @@ class CacheAnalyzer:
                 cache = CacheManager(policy=policy, cache_size=size)
                 
                 # Simular carga de trabajo
-                self._simulate_workload(cache, iterations=1000)
+                await self._simulate_workload(cache, iterations=1000)
                 
                 # Obtener métricas
-                metrics = cache.get_detailed_metrics()
+                metrics = await cache.get_detailed_metrics()
                 self.results[key] = metrics
                 
                 logger.info(f"Completado: {policy} con tamaño {size}")
-                cache.clear_cache()
+                await cache.clear_cache()
         
         return self.results
     
-    def _simulate_workload(self, cache, iterations=1000):
+    async def _simulate_workload(self, cache, iterations=1000):
         """Simular carga de trabajo con patrones de acceso realistas"""
+        import itertools
         import random
-        
+
         # Conjunto de preguntas simuladas
         questions = [
             f"¿Pregunta frecuente {i}?" for i in range(50)  # Preguntas frecuentes
@@ -316,325 +778,64 @@ class CacheAnalyzer:
             f"¿Pregunta rara {i}?" for i in range(200)  # Preguntas raras
         ]
         
-        # Pesos para simular patrón 80/20 (Principio de Pareto)
+        # Pesos para simular patrón 80/20 (Principio de Pareto). choices()
+        # recalcula los pesos acumulados en cada llamada (O(N)): acumularlos
+        # una vez y sortear las N preguntas de una sola pasada evita ese
+        # costo por iteración
         weights = [0.8/50] * 50 + [0.2/200] * 200
-        
-        for i in range(iterations):
-            question = random.choices(questions, weights=weights)[0]
-            
-            # Buscar en cache
-            result = cache.get(question, f"contenido {i % 100}")
-            
-            if result is None:
-                # Cache miss: simular respuesta LLM
-                fake_response = {
-                    'llm_answer': f'Respuesta simulada para {question}',
+        cum_weights = list(itertools.accumulate(weights))
+        picks = random.choices(questions, cum_weights=cum_weights, k=iterations)
+
+        # Lotes de 50: cada get/set individual es un RTT a Redis y las 9
+        # combinaciones (política, tamaño) suman miles de viajes seriales;
+        # get_many/set_many los colapsan a un pipeline por lote
+        batch_size = 50
+        for batch_start in range(0, iterations, batch_size):
+            batch_end = min(batch_start + batch_size, iterations)
+            pairs = [
+                (picks[i], f"contenido {i % 100}")
+                for i in range(batch_start, batch_end)
+            ]
+
+            results = await cache.get_many(pairs)
+
+            # Cache miss: simular respuesta LLM y escribir el lote faltante
+            misses = [
+                (title, content, {
+                    'llm_answer': f'Respuesta simulada para {title}',
                     'quality_score': random.uniform(0.5, 1.0),
                     'timestamp': datetime.now().isoformat()
-                }
-                cache.set(question, f"contenido {i % 100}", fake_response)
-    
-    def _generate_key(self, question_title: str, question_content: str = "") -> str:
-        """Generar una clave única para la pregunta"""
-        content = f"{question_title}|{question_content}".strip()
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
-    
-    def get(self, question_title: str, question_content: str = "") -> Optional[Dict[str, Any]]:
-        """Buscar una respuesta en el cache"""
-        self.cache_stats['total_operations'] += 1
-        
-        if not self.redis_client:
-            self.misses += 1
-            self.cache_stats['misses'] += 1
-            return None
-            
-        try:
-            cache_key = self._generate_key(question_title, question_content)
-            cached_data = self.redis_client.get(cache_key)
-            
-            if cached_data:
-                # Verificar que cached_data es una string antes de deserializar
-                if isinstance(cached_data, str):
-                    self.hits += 1
-                    self.cache_stats['hits'] += 1
-                    
-                    # Actualizar TTL para simular LRU (acceso reciente)
-                    self.redis_client.expire(cache_key, self.cache_ttl)
-                    
-                    logger.info(f"Cache HIT para pregunta: '{question_title[:100]}'")
-                    return json.loads(cached_data)
-                else:
-                    logger.warning(f"Datos del cache en formato incorrecto")
-                    self.misses += 1
-                    self.cache_stats['misses'] += 1
-                    return None
-            else:
-                self.misses += 1
-                self.cache_stats['misses'] += 1
-                logger.info(f"Cache MISS para pregunta: '{question_title[:100]}'")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error accediendo al cache: {e}")
-            self.misses += 1
-            self.cache_stats['misses'] += 1
-            return None
+                })
+                for (title, content), result in zip(pairs, results)
+                if result is None
+            ]
+            if misses:
+                await cache.set_many(misses)
     
-    def set(self, question_title: str, question_content: str, data: Dict[str, Any]) -> bool:
-        """Almacenar una respuesta en el cache"""
-        if not self.redis_client:
-            return False
-            
-        try:
-            cache_key = self._generate_key(question_title, question_content)
-            
-            # Añadir timestamp para gestión de TTL
-            data['cached_at'] = datetime.utcnow().isoformat()
-            
-            # Verificar el tamaño del cache y limpiar si es necesario
-            self._manage_cache_size()
-            
-            # Almacenar en Redis con TTL
-            success = self.redis_client.setex(
-                cache_key, 
-                self.cache_ttl, 
-                json.dumps(data, default=str)
-            )
-            
-            if success:
-                self.cache_stats['sets'] += 1
-                logger.info(f"Cache SET para pregunta: '{question_title[:100]}'")
-                return True
-            else:
-                logger.warning(f"No se pudo almacenar en cache: '{question_title[:100]}'")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error almacenando en cache: {e}")
-            return False
-    
-    def _manage_cache_size(self):
-        """Gestionar el tamaño del cache implementando LRU"""
-        if not self.redis_client:
-            return
-            
-        try:
-            current_size_result = self.redis_client.dbsize()
-            
-            # Verificar que el resultado es un entero
-            if not isinstance(current_size_result, int):
-                logger.warning("No se pudo obtener el tamaño del cache")
-                return
-                
-            current_size = current_size_result
-            
-            if current_size >= self.max_cache_size:
-                # Obtener todas las claves con su TTL
-                keys_result = self.redis_client.keys('*')
-                
-                # Verificar que el resultado es una lista
-                if not isinstance(keys_result, list):
-                    logger.warning("No se pudieron obtener las claves del cache")
-                    return
-                
-                keys = keys_result
-                
-                # Si hay demasiadas claves, eliminar las más antiguas
-                if len(keys) >= self.max_cache_size:
-                    # Ordenar por TTL (las que tienen menor TTL son más antiguas)
-                    keys_with_ttl = []
-                    for key in keys:
-                        ttl = self.redis_client.ttl(key)
-                        if isinstance(ttl, int):
-                            keys_with_ttl.append((key, ttl))
-                    
-                    # Ordenar por TTL ascendente
-                    keys_with_ttl.sort(key=lambda x: x[1])
-                    
-                    # Eliminar el 10% de las claves más antiguas
-                    keys_to_remove = int(len(keys_with_ttl) * 0.1)
-                    evicted_keys = 0
-                    for i in range(keys_to_remove):
-                        if self.redis_client.delete(keys_with_ttl[i][0]):
-                            evicted_keys += 1
-                    
-                    self.cache_stats['evictions'] += evicted_keys
-                    logger.info(f"Limpieza de cache: eliminadas {evicted_keys} entradas (política TTL-LRU)")
-                    
-        except Exception as e:
-            logger.error(f"Error gestionando tamaño del cache: {e}")
-    
-    def update_access_count(self, question_title: str, question_content: str = ""):
-        """Actualizar el contador de acceso en el cache"""
-        if not self.redis_client:
-            return 1
-            
-        try:
-            cache_key = self._generate_key(question_title, question_content)
-            cached_data = self.redis_client.get(cache_key)
-            
-            if cached_data and isinstance(cached_data, str):
-                data = json.loads(cached_data)
-                data['access_count'] = data.get('access_count', 1) + 1
-                data['last_accessed'] = datetime.utcnow().isoformat()
-                
-                # Actualizar en Redis
-                self.redis_client.setex(
-                    cache_key,
-                    self.cache_ttl,
-                    json.dumps(data, default=str)
-                )
-                
-                logger.info(f"Contador actualizado para: {question_title[:50]}...")
-                return data['access_count']
-            
-        except Exception as e:
-            logger.error(f"Error actualizando contador de acceso: {e}")
-        
-        return 1
-    
-    def get_cache_stats(self) -> Dict[str, Any]:
-        """Obtener estadísticas del cache"""
-        try:
-            total_requests = self.hits + self.misses
-            hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
-            miss_rate = (self.misses / total_requests * 100) if total_requests > 0 else 0
-            
-            if self.redis_client:
-                cache_size_result = self.redis_client.dbsize()
-                memory_info_result = self.redis_client.info('memory')
-                
-                cache_size = cache_size_result if isinstance(cache_size_result, int) else 0
-                
-                # Manejo seguro de memory_info
-                memory_used = 'N/A'
-                memory_peak = 'N/A'
-                if isinstance(memory_info_result, dict):
-                    memory_used = memory_info_result.get('used_memory_human', 'N/A')
-                    memory_peak = memory_info_result.get('used_memory_peak_human', 'N/A')
-            else:
-                cache_size = 0
-                memory_used = 'N/A'
-                memory_peak = 'N/A'
-            
-            return {
-                'hits': self.hits,
-                'misses': self.misses,
-                'total_requests': total_requests,
-                'hit_rate': round(hit_rate, 2),
-                'miss_rate': round(miss_rate, 2),
-                'cache_size': cache_size,
-                'max_cache_size': self.max_cache_size,
-                'cache_ttl': self.cache_ttl,
-                'memory_used': memory_used,
-                'memory_peak': memory_peak
-            }
-            
-        except Exception as e:
-            logger.error(f"Error obteniendo estadísticas del cache: {e}")
-            return {
-                'hits': self.hits,
-                'misses': self.misses,
-                'total_requests': self.hits + self.misses,
-                'hit_rate': 0,
-                'miss_rate': 0,
-                'cache_size': 0,
-                'max_cache_size': self.max_cache_size,
-                'cache_ttl': self.cache_ttl,
-                'memory_used': 'N/A',
-                'memory_peak': 'N/A'
-            }
-    
-    def clear_cache(self):
-        """Limpiar todo el cache"""
-        if not self.redis_client:
-            logger.warning("No hay conexión a Redis para limpiar cache")
-            return
-            
-        try:
-            self.redis_client.flushdb()
-            self.hits = 0
-            self.misses = 0
-            logger.info("Cache limpiado completamente")
-        except Exception as e:
-            logger.error(f"Error limpiando cache: {e}")
-    
-    def get_cache_stats(self) -> Dict[str, Any]:
-        """Obtener estadísticas detalladas del cache"""
-        try:
-            # Calcular métricas adicionales
-            total_ops = self.cache_stats['total_operations']
-            hits = self.cache_stats['hits']
-            misses = self.cache_stats['misses']
-            
-            hit_rate = (hits / total_ops * 100) if total_ops > 0 else 0
-            miss_rate = (misses / total_ops * 100) if total_ops > 0 else 0
-            
-            # Obtener info actual de Redis
-            current_size = 0
-            memory_usage = 0
-            if self.redis_client:
-                try:
-                    current_size = self.redis_client.dbsize()
-                    info = self.redis_client.info('memory')
-                    memory_usage = info.get('used_memory', 0)
-                except:
-                    pass
-            
-            runtime = datetime.now() - self.cache_stats['start_time']
-            
-            return {
-                'policy_type': self.cache_stats['policy_type'],
-                'runtime_seconds': runtime.total_seconds(),
-                'total_operations': total_ops,
-                'hits': hits,
-                'misses': misses,
-                'sets': self.cache_stats['sets'],
-                'evictions': self.cache_stats['evictions'],
-                'hit_rate_percent': round(hit_rate, 2),
-                'miss_rate_percent': round(miss_rate, 2),
-                'current_cache_size': current_size,
-                'max_cache_size': self.max_cache_size,
-                'memory_usage_bytes': memory_usage,
-                'cache_efficiency': round(hits / (hits + misses + self.cache_stats['evictions']) * 100, 2) if (hits + misses + self.cache_stats['evictions']) > 0 else 0
-            }
-        except Exception as e:
-            logger.error(f"Error calculando estadísticas: {e}")
-            return {}
-    
-    def reset_stats(self):
-        """Reiniciar estadísticas del cache"""
-        self.cache_stats = {
-            'hits': 0,
-            'misses': 0,
-            'evictions': 0,
-            'sets': 0,
-            'total_operations': 0,
-            'policy_type': 'TTL-LRU',
-            'start_time': datetime.now()
-        }
-        self.hits = 0
-        self.misses = 0
-        logger.info("Estadísticas del cache reiniciadas")
 
-if __name__ == "__main__":
-    # Probar el sistema de cache
+async def _demo():
+    """Prueba manual del sistema de cache."""
     cache = CacheManager()
-    
+
     # Ejemplo de uso
     test_data = {
         'llm_answer': 'Esta es una respuesta de prueba',
         'quality_score': 0.85,
         'access_count': 1
     }
-    
+
     # Almacenar en cache
-    cache.set("¿Qué es Python?", "Explica qué es Python", test_data)
-    
+    await cache.set("¿Qué es Python?", "Explica qué es Python", test_data)
+
     # Buscar en cache
-    result = cache.get("¿Qué es Python?", "Explica qué es Python")
+    result = await cache.get("¿Qué es Python?", "Explica qué es Python")
     print("Resultado del cache:", result)
-    
+
     # Ver estadísticas
-    stats = cache.get_cache_stats()
+    stats = await cache.get_detailed_metrics()
     print("Estadísticas del cache:", stats)
+
+
+if __name__ == "__main__":
+    # Probar el sistema de cache
+    asyncio.run(_demo())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Script para revisar el progreso del procesamiento LLM
+Muestra totales, avance y las últimas preguntas procesadas
+"""
+
+import os
+import sys
+
+import psycopg2
+
+
+def main():
+    print("=== PROGRESO DEL PROCESAMIENTO LLM ===")
+
+    conn_params = {
+        'host': os.getenv('POSTGRES_HOST', 'localhost'),
+        'port': 5432,
+        'database': os.getenv('POSTGRES_DB', 'yahoo_answers'),
+        'user': os.getenv('POSTGRES_USER', 'postgres'),
+        'password': os.getenv('POSTGRES_PASSWORD', 'postgres123')
+    }
+
+    try:
+        with psycopg2.connect(**conn_params) as pg_conn:
+            with pg_conn.cursor() as cursor:
+                # Total y procesadas en UNA sola consulta (un round-trip):
+                # COUNT(*) FILTER resuelve ambos conteos en la misma pasada
+                # en vez de dos consultas secuenciales
+                cursor.execute("""
+                    SELECT COUNT(*) AS total,
+                           COUNT(*) FILTER (WHERE llm_answer IS NOT NULL
+                                            AND llm_answer <> '') AS procesadas
+                    FROM questions
+                """)
+                total, procesadas = cursor.fetchone()
+
+                porcentaje = (procesadas / total * 100) if total else 0
+                print(f"Total de preguntas:      {total}")
+                print(f"Procesadas con LLM:      {procesadas}")
+                print(f"Pendientes:              {total - procesadas}")
+                print(f"Avance:                  {porcentaje:.1f}%")
+
+                # Últimas 5 procesadas
+                cursor.execute("""
+                    SELECT id, question_title, quality_score
+                    FROM questions
+                    WHERE llm_answer IS NOT NULL AND llm_answer <> ''
+                    ORDER BY id DESC
+                    LIMIT 5
+                """)
+                recientes = cursor.fetchall()
+
+        if recientes:
+            print("\nÚltimas preguntas procesadas:")
+            for qid, titulo, score in recientes:
+                print(f"  [{qid}] {titulo[:70]} (score: {score})")
+
+    except Exception as e:
+        print(f"Error consultando progreso: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
+import hashlib
+import io
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, Index, text
+import time
+from collections import deque
+from sqlalchemy import create_engine, Column, Integer, LargeBinary, String, Text, Float, DateTime, Index, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 from datetime import datetime
 import logging
 
@@ -11,6 +17,70 @@ logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+
+def question_content_hash(question_title, question_content):
+    """
+    Hash de 16 bytes que identifica una pregunta por (título, contenido).
+
+    Clave de ancho fijo para el probe de existencia y el ON CONFLICT del
+    upsert: comparar 16 bytes en un índice es mucho más barato que comparar
+    dos columnas TEXT sin límite. blake2b por consistencia con las claves
+    de cache (no criptográfico, solo identidad).
+    """
+    raw = f"{question_title}\x1f{question_content or ''}".encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def copy_escape(value):
+    """Escapar un valor para el formato texto de COPY FROM STDIN."""
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+# Engines compartidos por URL de conexión. Cada create_engine abre su propio
+# pool de conexiones TCP; como el analizador instancia varios managers
+# (main + ExperimentRunner), sin esto cada instancia duplicaría el pool.
+_ENGINES = {}
+
+
+def _get_shared_engine(database_url):
+    """Obtener (o crear una sola vez) el engine pooled para una URL dada."""
+    engine = _ENGINES.get(database_url)
+    if engine is None:
+        if os.getenv('PGBOUNCER') == '1':
+            # Detrás de un pooler de transacciones (PgBouncer) el pooling ya
+            # ocurre en el pooler: un QueuePool local solo retendría sockets
+            # ociosos que, multiplicados por proceso, agotan max_connections
+            pool_kwargs = {'poolclass': NullPool}
+        else:
+            pool_kwargs = {
+                'poolclass': QueuePool,
+                # Dimensionado para los workers LLM concurrentes + escrituras
+                # batch; configurable por entorno sin tocar código
+                'pool_size': int(os.getenv('POSTGRES_POOL_SIZE', '20')),
+                'max_overflow': int(os.getenv('POSTGRES_MAX_OVERFLOW', '40')),
+                'pool_timeout': 30,
+                'pool_use_lifo': True,  # Reusar la conexión más caliente y dejar vencer las ociosas
+                'pool_pre_ping': True,  # Verificar conexiones antes de usar
+                'pool_recycle': 1800,   # Reciclar conexiones cada 30 minutos
+            }
+        engine = create_engine(
+            database_url,
+            echo=False,
+            query_cache_size=1200,  # Cache de SQL compilado para las queries ORM repetidas
+            connect_args={
+                "connect_timeout": 10,
+                "options": "-c timezone=UTC"
+            },
+            **pool_kwargs
+        )
+        _ENGINES[database_url] = engine
+    return engine
+
 class Question(Base):
     """Modelo para almacenar las preguntas y respuestas"""
     __tablename__ = 'questions'
@@ -18,6 +88,8 @@ class Question(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     question_title = Column(Text, nullable=False)
     question_content = Column(Text, nullable=False, default='')
+    # Hash persistido de (título, contenido): target único del upsert
+    content_hash = Column(LargeBinary(16), unique=True, index=True)
     original_answer = Column(Text, nullable=True)
     llm_answer = Column(Text, nullable=True)
     quality_score = Column(Float, nullable=True, default=0.0)
@@ -31,10 +103,31 @@ class Question(Base):
     # Crear índices para mejorar el rendimiento
     __table_args__ = (
         Index('idx_questions_title_content', 'question_title', 'question_content'),
-        Index('idx_questions_quality_score', 'quality_score'),
+        # Índice parcial solo sobre filas sin procesar (score por defecto):
+        # el probe "WHERE quality_score = 0.0 LIMIT 1" toca una sola página
+        # y el índice se achica a medida que avanza el procesamiento, en vez
+        # de indexar también todas las filas ya procesadas
+        Index('idx_questions_unprocessed', 'id',
+              postgresql_where=text('quality_score = 0.0')),
         Index('idx_questions_access_count', 'access_count'),
         Index('idx_questions_created_at', 'created_at'),
         Index('idx_questions_class', 'original_class'),
+        # Índice parcial para las consultas de progreso: tanto el conteo de
+        # procesadas como el ORDER BY id DESC LIMIT 5 de check_progress.py
+        # se resuelven con un range scan del índice en vez de recorrer y
+        # ordenar todas las filas procesadas
+        Index('idx_questions_processed_id_desc', text('id DESC'),
+              postgresql_where=text("llm_answer IS NOT NULL AND llm_answer <> ''")),
+        # Índices invertidos para búsquedas de texto: los btree de arriba
+        # solo sirven igualdad exacta. El tsvector acelera consultas
+        # @@ to_tsquery('spanish', ...) y el trigram los LIKE '%...%';
+        # ambos pasan de scan secuencial a lookup sublineal
+        Index('idx_questions_fts',
+              text("to_tsvector('spanish', question_title || ' ' || question_content)"),
+              postgresql_using='gin'),
+        Index('idx_questions_title_trgm', 'question_title',
+              postgresql_using='gin',
+              postgresql_ops={'question_title': 'gin_trgm_ops'}),
     )
 
 class MultiModelResult(Base):
@@ -90,18 +183,14 @@ class DatabaseManager:
         # Crear URL de conexión
         self.database_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
         
-        # Crear engine y session con configuración robusta
-        self.engine = create_engine(
-            self.database_url, 
-            echo=False,
-            pool_pre_ping=True,  # Verificar conexiones antes de usar
-            pool_recycle=3600,   # Reciclar conexiones cada hora
-            connect_args={
-                "connect_timeout": 10,
-                "options": "-c timezone=UTC"
-            }
+        # Reutilizar el engine pooled compartido para esta URL
+        self.engine = _get_shared_engine(self.database_url)
+        self.SessionLocal = sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            expire_on_commit=False,
+            bind=self.engine
         )
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         
     def test_connection(self):
         """Probar la conexión a la base de datos"""
@@ -135,6 +224,10 @@ class DatabaseManager:
     def create_tables(self):
         """Crear todas las tablas"""
         try:
+            # pg_trgm debe existir antes de crear el índice gin_trgm_ops
+            with self.engine.connect() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.commit()
             Base.metadata.create_all(bind=self.engine)
             logger.info("Tablas creadas exitosamente")
         except Exception as e:
@@ -151,67 +244,197 @@ class DatabaseManager:
 
 class PostgreSQLManager(DatabaseManager):
     """Gestor especializado para almacenar resultados de consultas"""
-    
+
+    # Umbrales del buffer de escrituras: se descarga al juntar K registros
+    # o al pasar T segundos desde la última descarga
+    FLUSH_BATCH_SIZE = 50
+    FLUSH_INTERVAL_SECONDS = 2.0
+
+    def __init__(self):
+        super().__init__()
+        self._pending_records = deque()
+        self._last_flush = time.monotonic()
+
+    def store_query_results_bulk(self, records):
+        """
+        Almacena o actualiza un lote de resultados en un solo round-trip.
+
+        Un INSERT ... ON CONFLICT DO UPDATE por lote reemplaza al patrón
+        SELECT + UPDATE/INSERT + commit por registro (3 round-trips por
+        pregunta). El conflicto se resuelve contra el índice único de
+        content_hash: los existentes suman acceso y refrescan
+        respuesta/score, los nuevos se insertan. RETURNING id devuelve los
+        ids (nuevos o existentes) en el mismo statement, sin un SELECT
+        posterior por registro.
+
+        Args:
+            records (list[dict]): registros con las mismas claves que
+                acepta store_query_result.
+
+        Returns:
+            list[int]: ids de las filas insertadas o actualizadas.
+        """
+        if not records:
+            return []
+
+        # Dedupe intra-lote por content_hash: dos filas con el mismo hash en
+        # un mismo INSERT ... ON CONFLICT son un error de Postgres ("cannot
+        # affect row a second time"), y con el buffer de 50 los duplicados
+        # dentro de un lote son el caso esperado en esta carga. Gana la
+        # última aparición y las repeticiones se acumulan en access_count
+        deduped = {}
+        for r in records:
+            key = question_content_hash(r['question_title'], r.get('question_content'))
+            prev = deduped.get(key)
+            deduped[key] = (r, prev[1] + 1 if prev else 1)
+
+        values = [
+            {
+                'question_title': r['question_title'],
+                'question_content': r.get('question_content') or '',
+                'content_hash': key,
+                'original_answer': r.get('original_answer'),
+                'llm_answer': r.get('llm_answer'),
+                'quality_score': r.get('quality_score'),
+                'access_count': count,
+            }
+            for key, (r, count) in deduped.items()
+        ]
+
+        stmt = pg_insert(Question).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['content_hash'],
+            set_={
+                # excluded.access_count trae los accesos del lote completo
+                'access_count': Question.access_count + stmt.excluded.access_count,
+                'llm_answer': func.coalesce(stmt.excluded.llm_answer, Question.llm_answer),
+                'quality_score': func.coalesce(stmt.excluded.quality_score, Question.quality_score),
+                'updated_at': func.now(),
+                'last_access': func.now(),
+            }
+        ).returning(Question.id)
+
+        session = self.get_session()
+        try:
+            ids = session.execute(stmt).scalars().all()
+            session.commit()
+            logger.info(f"Lote de {len(values)} resultados almacenado")
+            return list(ids)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error almacenando lote de resultados: {e}")
+            raise
+        finally:
+            self.close_session(session)
+
     def store_query_result(self, record_data):
         """
-        Almacena o actualiza un resultado de consulta en la base de datos.
-        
+        Encola un resultado y lo persiste en lote.
+
+        Mantiene la firma histórica de un registro por llamada, pero en vez
+        de ir a la base por cada uno acumula en un buffer que se descarga
+        vía store_query_results_bulk cada FLUSH_BATCH_SIZE registros o
+        FLUSH_INTERVAL_SECONDS segundos. Llamar a flush_pending() al
+        terminar garantiza que no queden registros sin persistir.
+
         Args:
             record_data (dict): Diccionario con los datos del record:
                 - question_title: título de la pregunta
-                - question_content: contenido de la pregunta  
+                - question_content: contenido de la pregunta
                 - original_answer: respuesta original
                 - llm_answer: respuesta del LLM (puede ser None)
                 - quality_score: puntuación de calidad (puede ser None)
                 - cache_hit: si fue hit o miss del cache
                 - timestamp: tiempo de la consulta
         """
-        session = self.get_session()
-        try:
-            # Buscar si ya existe una pregunta con el mismo título y contenido
-            existing_question = session.query(Question).filter(
-                Question.question_title == record_data['question_title'],
-                Question.question_content == record_data.get('question_content')
-            ).first()
-            
-            if existing_question:
-                # Actualizar pregunta existente
-                existing_question.access_count += 1
-                existing_question.updated_at = datetime.utcnow()
-                
-                # Actualizar respuesta LLM y score si se proporcionan
-                if record_data.get('llm_answer'):
-                    existing_question.llm_answer = record_data['llm_answer']
-                if record_data.get('quality_score') is not None:
-                    existing_question.quality_score = record_data['quality_score']
-                    
-                logger.info(f"Actualizada pregunta existente: {record_data['question_title'][:50]}... "
-                           f"(accesos: {existing_question.access_count})")
-            else:
-                # Crear nueva pregunta
-                new_question = Question(
-                    question_title=record_data['question_title'],
-                    question_content=record_data.get('question_content'),
-                    original_answer=record_data['original_answer'],
-                    llm_answer=record_data.get('llm_answer'),
-                    quality_score=record_data.get('quality_score'),
-                    access_count=1
+        self._pending_records.append(record_data)
+
+        now = time.monotonic()
+        if (len(self._pending_records) >= self.FLUSH_BATCH_SIZE
+                or now - self._last_flush >= self.FLUSH_INTERVAL_SECONDS):
+            self.flush_pending()
+
+    def flush_pending(self):
+        """Persistir inmediatamente los registros pendientes del buffer.
+
+        Returns:
+            list[int]: ids de las filas afectadas (vacío si no había nada).
+        """
+        if not self._pending_records:
+            self._last_flush = time.monotonic()
+            return []
+        batch = list(self._pending_records)
+        self._pending_records.clear()
+        self._last_flush = time.monotonic()
+        return self.store_query_results_bulk(batch)
+
+    # Alias del helper de módulo, mantenido por compatibilidad con los
+    # llamadores que lo usaban como método
+    _copy_escape = staticmethod(copy_escape)
+
+    def bulk_update_llm_results(self, rows):
+        """
+        Backfill masivo de llm_answer/quality_score por id vía COPY.
+
+        Para relotear decenas de miles de filas, un UPDATE por fila (o
+        incluso executemany) sigue pagando parse/plan por sentencia. COPY
+        carga el lote entero a una tabla staging UNLOGGED (sin WAL) en un
+        solo stream y un único UPDATE ... FROM lo aplica en una pasada,
+        tocando los índices una sola vez.
+
+        Args:
+            rows: iterable de tuplas (id, quality_score, llm_answer)
+        """
+        rows = list(rows)
+        if not rows:
+            return
+
+        buf = io.StringIO()
+        for qid, score, answer in rows:
+            buf.write(f"{qid}\t{self._copy_escape(score)}\t{self._copy_escape(answer)}\n")
+        buf.seek(0)
+
+        with self.engine.begin() as conn:
+            cur = conn.connection.cursor()
+            try:
+                cur.execute("""
+                    CREATE UNLOGGED TABLE IF NOT EXISTS questions_staging (
+                        id INTEGER PRIMARY KEY,
+                        quality_score DOUBLE PRECISION,
+                        llm_answer TEXT
+                    )
+                """)
+                cur.execute("TRUNCATE questions_staging")
+                cur.copy_expert(
+                    "COPY questions_staging (id, quality_score, llm_answer) FROM STDIN",
+                    buf
                 )
-                session.add(new_question)
-                logger.info(f"Nueva pregunta almacenada: {record_data['question_title'][:50]}...")
-            
-            session.commit()
-            
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error almacenando resultado: {e}")
-            raise
-        finally:
-            self.close_session(session)
+                # COALESCE: las filas sin respuesta (caminos de error) solo
+                # actualizan el score; no deben pisar con NULL una respuesta
+                # ya persistida (mismo criterio que store_query_results_bulk)
+                cur.execute("""
+                    UPDATE questions q
+                    SET quality_score = s.quality_score,
+                        llm_answer = COALESCE(s.llm_answer, q.llm_answer),
+                        updated_at = now()
+                    FROM questions_staging s
+                    WHERE q.id = s.id
+                """)
+                cur.execute("TRUNCATE questions_staging")
+            finally:
+                cur.close()
+        logger.info(f"Backfill de {len(rows)} filas aplicado vía COPY")
+
+# Gestor de BD como singleton perezoso: construir uno nuevo por llamada
+# tiraba el sessionmaker (el engine ya se compartía vía _ENGINES)
+_DB_MANAGER = None
+
 
-# Función para obtener una instancia del gestor de BD
 def get_database_manager():
-    return DatabaseManager()
+    global _DB_MANAGER
+    if _DB_MANAGER is None:
+        _DB_MANAGER = DatabaseManager()
+    return _DB_MANAGER
 
 if __name__ == "__main__":
     # Crear las tablas al ejecutar el script directamente
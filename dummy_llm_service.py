@@ -5,15 +5,29 @@ Genera respuestas simuladas basadas en el contenido de las preguntas sin APIs ex
 """
 
 import asyncio
+import itertools
 import logging
+import os
 import random
+import re
 import time
 import hashlib
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# Template fijo por estilo de respuesta: el cuerpo es constante, solo el
+# topic varía. Precompilados a nivel de módulo evita re-armar el f-string y
+# la cadena de ifs sobre response_style en cada llamada del hot path
+_STYLE_TEMPLATES = {
+    "detailed": "Respecto a {}, es importante considerar varios aspectos fundamentales. Esta pregunta involucra elementos técnicos específicos que requieren análisis detallado y consideración de múltiples variables para una comprensión completa.",
+    "concise": "En relación con {}, la respuesta implica factores específicos que deben evaluarse según el contexto y los objetivos planteados.",
+    "balanced": "Sobre {}, podemos explicar que involucra varios conceptos importantes que se interrelacionan de manera específica según las circunstancias.",
+}
+
 
 class DummyLLMService:
     """
@@ -61,6 +75,18 @@ class DummyLLMService:
         }
     }
     
+    # Errores transitorios: vale la pena reintentar (timeouts, red caída).
+    # El resto (errores de programación, datos corruptos) es permanente y
+    # reintentar solo gastaría tiempo repitiendo el mismo fallo.
+    TRANSIENT_ERRORS = (asyncio.TimeoutError, ConnectionError, OSError)
+
+    # Límites por llamada: una petición colgada se corta a los 20s (cuenta
+    # como error transitorio y se reintenta) y nunca se reintenta más de
+    # 3 veces. Así la latencia de cola queda acotada en vez de depender
+    # del peor caso de cada modelo.
+    REQUEST_TIMEOUT = 20.0
+    MAX_RETRIES = 3
+
     # Templates de respuestas por categoría de pregunta
     RESPONSE_TEMPLATES = {
         "technology": [
@@ -90,64 +116,101 @@ class DummyLLMService:
         ]
     }
     
-    def __init__(self, selected_models: Optional[List[str]] = None):
+    def __init__(self, selected_models: Optional[List[str]] = None,
+                 max_concurrent_per_model: int = 10):
         """
         Inicializa el servicio LLM simulado.
-        
+
         Args:
             selected_models: Lista de modelos a simular. Si None, usa todos los disponibles.
+            max_concurrent_per_model: Límite de llamadas concurrentes por modelo,
+                simulando el rate limit que impondría cada proveedor real.
         """
         self.available_models = list(self.DUMMY_MODELS.keys())
-        
+
         if selected_models is None:
             selected_models = self.available_models
-        
+
         # Filtrar solo modelos disponibles
         self.selected_models = [m for m in selected_models if m in self.DUMMY_MODELS]
-        
+
         if not self.selected_models:
             logger.warning("Ningún modelo válido seleccionado. Usando todos los disponibles.")
             self.selected_models = self.available_models
-        
+
+        # Semáforo por modelo: acota la concurrencia de cada "proveedor" de
+        # forma independiente, para que un modelo lento no acapare el fan-out
+        self.max_concurrent_per_model = max_concurrent_per_model
+        self._model_semaphores = {
+            model: asyncio.Semaphore(max_concurrent_per_model)
+            for model in self.selected_models
+        }
+
+        # Contexto (info, semáforo) resuelto de una vez por modelo: los hot
+        # paths hacen un solo .get en lugar de buscar en DUMMY_MODELS y en
+        # _model_semaphores por separado (el setdefault además construía un
+        # Semaphore descartable en cada llamada solo para el argumento)
+        self._model_runtime = {
+            model: (self.DUMMY_MODELS[model], self._model_semaphores[model])
+            for model in self.selected_models
+        }
+
+        # Latencia simulada opcional: cada sleep es un pase por el scheduler
+        # del event loop, y a miles de preguntas ese overhead domina. Por
+        # defecto el stub responde sin dormir; DUMMY_SIMULATE_LATENCY=1
+        # restaura la pausa para quien quiera tiempos "realistas"
+        self.simulate_latency = os.getenv('DUMMY_SIMULATE_LATENCY') == '1'
+
         self.initialized = True
         logger.info(f"DummyLLM inicializado con modelos: {', '.join(self.selected_models)}")
     
+    # Patrones de categoría precompilados en orden de precedencia: un solo
+    # scan C por categoría (re.IGNORECASE evita el .lower() previo) en vez
+    # de reconstruir cuatro listas y recorrerlas con `in` por llamada.
+    # Sin \b a propósito: se preserva la semántica de substring original
+    # ("tech" matchea "technology")
+    _CATEGORY_PATTERNS = [
+        ("how_to", re.compile(r"how to|how do|how can|steps|tutorial|guide|instruction|method", re.IGNORECASE)),
+        ("definition", re.compile(r"what is|what are|define|definition|meaning|explain|concept", re.IGNORECASE)),
+        ("technology", re.compile(r"software|computer|programming|code|app|website|internet|digital|technology|tech", re.IGNORECASE)),
+        ("science", re.compile(r"science|biology|chemistry|physics|research|study|experiment|theory|scientific", re.IGNORECASE)),
+    ]
+
     def _categorize_question(self, question_title: str, question_content: str = "") -> str:
         """
         Categoriza la pregunta basándose en palabras clave para generar respuestas más apropiadas.
         """
-        full_text = f"{question_title} {question_content}".lower()
-        
-        # Palabras clave por categoría
-        tech_keywords = ["software", "computer", "programming", "code", "app", "website", "internet", "digital", "technology", "tech"]
-        science_keywords = ["science", "biology", "chemistry", "physics", "research", "study", "experiment", "theory", "scientific"]
-        how_to_keywords = ["how to", "how do", "how can", "steps", "tutorial", "guide", "instruction", "method"]
-        definition_keywords = ["what is", "what are", "define", "definition", "meaning", "explain", "concept"]
-        
-        if any(keyword in full_text for keyword in how_to_keywords):
-            return "how_to"
-        elif any(keyword in full_text for keyword in definition_keywords):
-            return "definition"
-        elif any(keyword in full_text for keyword in tech_keywords):
-            return "technology"
-        elif any(keyword in full_text for keyword in science_keywords):
-            return "science"
-        else:
-            return "general"
+        full_text = f"{question_title} {question_content}"
+
+        for category, pattern in self._CATEGORY_PATTERNS:
+            if pattern.search(full_text):
+                return category
+        return "general"
     
+    # Palabras de 4+ letras en una sola pasada del motor de regex: reemplaza
+    # el split + strip de puntuación + filtro por longitud en tres pasadas
+    _WORD_RE = re.compile(r"[a-záéíóúñü]{4,}")
+
+    # Palabras comunes a filtrar (solo las de 4+ letras pueden llegar aquí)
+    _STOP_WORDS = frozenset({"which", "with", "that", "this", "para", "como", "sobre", "entre"})
+
     def _extract_keywords(self, text: str) -> List[str]:
         """
         Extrae palabras clave relevantes del texto de la pregunta.
         """
-        # Palabras comunes a filtrar
-        stop_words = {"the", "is", "at", "which", "on", "a", "an", "and", "or", "but", "in", "with", "to", "for", "of", "as", "by"}
-        
-        words = text.lower().split()
-        keywords = [word.strip(".,?!:;") for word in words if len(word) > 3 and word not in stop_words]
-        
-        # Retornar las 3-5 palabras más relevantes
-        return keywords[:5]
+        # islice corta apenas hay 5 palabras válidas, sin materializar el resto
+        return list(itertools.islice(
+            (w for w in self._WORD_RE.findall(text.lower()) if w not in self._STOP_WORDS),
+            5
+        ))
     
+    # Template resuelto por modelo de una vez (modelo -> template), para no
+    # pasar por DUMMY_MODELS + response_style en cada respuesta
+    _TEMPLATE_BY_MODEL = {
+        model: _STYLE_TEMPLATES.get(info["response_style"], _STYLE_TEMPLATES["balanced"])
+        for model, info in DUMMY_MODELS.items()
+    }
+
     def _generate_realistic_content(self, question_title: str, question_content: str, model_name: str) -> str:
         """
         Genera contenido de respuesta realista OPTIMIZADO - versión ultra-rápida.
@@ -155,37 +218,64 @@ class DummyLLMService:
         # Extracción simple de keywords (primera palabra significativa)
         words = question_title.lower().split()
         topic = next((w for w in words if len(w) > 3), "tema")
-        
-        # Templates ultra-simples por modelo
-        model_info = self.DUMMY_MODELS[model_name]
-        
-        if model_info["response_style"] == "detailed":
-            response = f"Respecto a {topic}, es importante considerar varios aspectos fundamentales. Esta pregunta involucra elementos técnicos específicos que requieren análisis detallado y consideración de múltiples variables para una comprensión completa."
-        elif model_info["response_style"] == "concise":
-            response = f"En relación con {topic}, la respuesta implica factores específicos que deben evaluarse según el contexto y los objetivos planteados."
-        else:  # balanced
-            response = f"Sobre {topic}, podemos explicar que involucra varios conceptos importantes que se interrelacionan de manera específica según las circunstancias."
-        
-        return response
+
+        return self._TEMPLATE_BY_MODEL[model_name].format(topic)
     
+    # Rangos de score por modelo, a nivel de clase para no reconstruir el
+    # dict literal en cada llamada del hot path
+    _SCORE_RANGES = {
+        "gpt-4o": (2.3, 3.0),
+        "gpt-4o-mini": (2.0, 2.8),
+        "mistral-nemo": (2.1, 2.9)
+    }
+    _DEFAULT_SCORE_RANGE = (2.0, 2.8)
+
+    @staticmethod
+    def _score_hash(question_title: str, model_name: str) -> int:
+        """
+        Hash estable en [0, 1000) para el mapeo pregunta→score.
+
+        hash() de Python depende de PYTHONHASHSEED (aleatorio por proceso),
+        así que el score "determinista" cambiaba entre corridas. blake2b de
+        8 bytes es estable entre procesos y sigue siendo barato.
+        """
+        digest = hashlib.blake2b(
+            f"{question_title}{model_name}".encode('utf-8'), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, 'big') % 1000
+
     def _calculate_deterministic_score(self, question_title: str, model_name: str) -> float:
         """
         Calcula score ULTRA-RÁPIDO usando hash simple.
         """
-        # Hash ultra-simple y rápido
-        hash_val = hash(f"{question_title}{model_name}") % 1000
-        
-        # Ranges simplificados por modelo
-        ranges = {
-            "gpt-4o": (2.3, 3.0),
-            "gpt-4o-mini": (2.0, 2.8),
-            "mistral-nemo": (2.1, 2.9)
-        }
-        
-        min_score, max_score = ranges.get(model_name, (2.0, 2.8))
+        hash_val = self._score_hash(question_title, model_name)
+
+        min_score, max_score = self._SCORE_RANGES.get(model_name, self._DEFAULT_SCORE_RANGE)
         score = min_score + ((hash_val / 1000.0) * (max_score - min_score))
-        
+
         return round(score, 2)
+
+    def _calculate_batch_scores(self, titles: List[str], model_name: str) -> np.ndarray:
+        """
+        Versión vectorizada de _calculate_deterministic_score para lotes.
+
+        El mapeo hash→score se hace con operaciones NumPy sobre el lote
+        completo en lugar de aritmética Python por fila.
+
+        Args:
+            titles: Títulos de las preguntas del lote
+            model_name: Modelo a puntuar
+
+        Returns:
+            Array float64 de scores (mismos valores que la versión escalar)
+        """
+        min_score, max_score = self._SCORE_RANGES.get(model_name, self._DEFAULT_SCORE_RANGE)
+        hash_vals = np.fromiter(
+            (self._score_hash(title, model_name) for title in titles),
+            dtype=np.float64,
+            count=len(titles)
+        )
+        return np.round(min_score + (hash_vals / 1000.0) * (max_score - min_score), 2)
     
     async def generate_answer_with_model(self, question_title: str, model_name: str,
                                        question_content: str = "") -> Optional[Tuple[str, Dict]]:
@@ -200,42 +290,43 @@ class DummyLLMService:
         Returns:
             Tuple de (respuesta, metadata) o None si hay error
         """
-        if model_name not in self.DUMMY_MODELS:
+        runtime = self._model_runtime.get(model_name)
+        if runtime is None:
             logger.error(f"Modelo {model_name} no disponible en DummyLLM")
             return None
-        
-        model_info = self.DUMMY_MODELS[model_name]
-        
+
+        model_info, semaphore = runtime
+
         try:
-            start_time = time.time()
-            
-            # Simular tiempo de respuesta realista del modelo
-            base_time = model_info["avg_response_time"]
-            variation = random.uniform(0.8, 1.2)  # Variación del ±20%
-            simulated_time = base_time * variation
-            await asyncio.sleep(0.001)  # ULTRA-RÁPIDO: solo 1ms para simular procesamiento
-            
-            # Generar respuesta basada en contenido
-            answer = self._generate_realistic_content(question_title, question_content, model_name)
-            
-            elapsed_time = time.time() - start_time
-            
-            # Score determinista basado en la pregunta y modelo
-            quality_score = self._calculate_deterministic_score(question_title, model_name)
-            
-            # Metadata realista
-            metadata = {
-                "model": model_name,
-                "provider": model_info["provider"],
-                "response_time": elapsed_time,
-                "token_count": len(answer.split()),
-                "cost_tier": model_info["cost_tier"],
-                "simulated": True
-            }
-            
-            logger.debug(f"DummyLLM {model_name}: {len(answer)} chars, score={quality_score}, time={elapsed_time:.2f}s")
-            return answer, metadata
-            
+            # Acotar concurrencia por modelo (simula el rate limit del proveedor)
+            async with semaphore:
+                start_time = time.time()
+
+                # Simular tiempo de procesamiento (solo si está habilitado)
+                if self.simulate_latency:
+                    await asyncio.sleep(0.001)
+
+                # Generar respuesta basada en contenido
+                answer = self._generate_realistic_content(question_title, question_content, model_name)
+
+                elapsed_time = time.time() - start_time
+
+                # Score determinista basado en la pregunta y modelo
+                quality_score = self._calculate_deterministic_score(question_title, model_name)
+
+                # Metadata realista
+                metadata = {
+                    "model": model_name,
+                    "provider": model_info["provider"],
+                    "response_time": elapsed_time,
+                    "token_count": len(answer.split()),
+                    "cost_tier": model_info["cost_tier"],
+                    "simulated": True
+                }
+
+                logger.debug(f"DummyLLM {model_name}: {len(answer)} chars, score={quality_score}, time={elapsed_time:.2f}s")
+                return answer, metadata
+
         except Exception as e:
             logger.error(f"Error en DummyLLM {model_name}: {e}")
             return None
@@ -252,23 +343,44 @@ class DummyLLMService:
         Returns:
             Diccionario con respuestas de cada modelo
         """
-        results = {}
-        
-        # Generar respuestas secuencialmente (simula rate limiting)
-        for model_name in self.selected_models:
+        # Los modelos son independientes: gather solapa sus latencias y el
+        # tiempo de pared pasa de la suma al máximo. El rate limit por
+        # modelo ya lo imponen los semáforos de generate_answer_with_model
+        answers = await asyncio.gather(
+            *(self._generate_with_retry(question_title, model_name, question_content)
+              for model_name in self.selected_models)
+        )
+        return {
+            model_name: result
+            for model_name, result in zip(self.selected_models, answers)
+            if result
+        }
+
+    async def _generate_with_retry(self, question_title: str, model_name: str,
+                                   question_content: str = "") -> Optional[Tuple[str, Dict]]:
+        """Llamada a un modelo con timeout por intento y backoff exponencial."""
+        for attempt in range(self.MAX_RETRIES):
             try:
-                result = await self.generate_answer_with_model(question_title, model_name, question_content)
-                if result:
-                    results[model_name] = result
-                
-                # SIN DELAY para máxima velocidad
-                # await asyncio.sleep(0.2)  # ELIMINADO para optimización
-                
+                return await asyncio.wait_for(
+                    self.generate_answer_with_model(question_title, model_name, question_content),
+                    timeout=self.REQUEST_TIMEOUT
+                )
+
+            except self.TRANSIENT_ERRORS as e:
+                # Fallo transitorio: reintentar con backoff exponencial
+                if attempt + 1 >= self.MAX_RETRIES:
+                    logger.error(f"Modelo {model_name} agotó reintentos: {e}")
+                else:
+                    backoff = min(8.0, 0.5 * (2 ** attempt))
+                    logger.warning(f"Error transitorio en {model_name} (intento {attempt + 1}): {e}")
+                    await asyncio.sleep(backoff)
+
             except Exception as e:
+                # Fallo permanente: reintentar no ayuda
                 logger.error(f"Error con modelo simulado {model_name}: {e}")
-                continue
-        
-        return results
+                return None
+
+        return None
     
     async def evaluate_model_comparison(self, question: str, answers: Dict[str, str]) -> Dict[str, float]:
         """
@@ -294,6 +406,93 @@ class DummyLLMService:
         
         return scores
     
+    async def process_questions_batch(self, questions: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Procesa un lote de preguntas con una sola "llamada" por modelo.
+
+        En lugar de un round-trip simulado por pregunta, el lote completo
+        comparte el overhead fijo de cada modelo (semáforo + latencia
+        simulada), análogo al request batching de las APIs reales donde un
+        prompt con N items amortiza el costo por llamada.
+
+        Args:
+            questions: Lista de tuplas (question_title, question_content)
+
+        Returns:
+            Lista de diccionarios (mismo formato que
+            process_question_multi_model), en el mismo orden de entrada
+        """
+        if not questions:
+            return []
+
+        batch_results = [{} for _ in questions]
+
+        # Los modelos se lanzan en paralelo con gather en lugar de esperar
+        # uno tras otro: el wall time del lote queda acotado por el modelo
+        # más lento y no por la suma de todos
+        per_model = await asyncio.gather(
+            *(self._process_batch_for_model(model_name, questions)
+              for model_name in self.selected_models),
+            return_exceptions=True
+        )
+
+        for model_name, outcome in zip(self.selected_models, per_model):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Error en lote con modelo simulado {model_name}: {outcome}")
+                continue
+            if outcome is None:
+                continue
+
+            model_info, answers, scores, per_item_time = outcome
+            for idx, answer in enumerate(answers):
+                batch_results[idx][model_name] = {
+                    "answer": answer,
+                    "metadata": {
+                        "model": model_name,
+                        "provider": model_info["provider"],
+                        "response_time": per_item_time,
+                        "token_count": len(answer.split()),
+                        "cost_tier": model_info["cost_tier"],
+                        "simulated": True
+                    },
+                    "quality_score": float(scores[idx]),
+                    "provider": model_info["provider"],
+                    "cost_tier": model_info["cost_tier"]
+                }
+
+        return batch_results
+
+    async def _process_batch_for_model(self, model_name: str, questions: List[Tuple[str, str]]):
+        """
+        Resuelve un lote completo contra un modelo simulado.
+
+        Returns:
+            Tupla (model_info, answers, scores, per_item_time), o None si el
+            modelo no existe.
+        """
+        runtime = self._model_runtime.get(model_name)
+        if runtime is None:
+            return None
+        model_info, semaphore = runtime
+
+        async with semaphore:
+            start_time = time.time()
+            # Un solo round-trip simulado para todo el lote
+            if self.simulate_latency:
+                await asyncio.sleep(0.001)
+
+            answers = [
+                self._generate_realistic_content(title, content or '', model_name)
+                for title, content in questions
+            ]
+            elapsed_time = time.time() - start_time
+            per_item_time = elapsed_time / len(questions)
+
+        scores = self._calculate_batch_scores(
+            [title for title, _ in questions], model_name
+        )
+        return model_info, answers, scores, per_item_time
+
     async def process_question_multi_model(self, question_title: str, question_content: str) -> Dict:
         """
         Procesa una pregunta con múltiples modelos simulados y proporciona análisis comparativo.
@@ -3,6 +3,8 @@
 
 -- Crear extensiones útiles
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+-- pg_trgm respalda el índice trigram de question_title (búsqueda difusa)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Crear tabla questions si no existe
 CREATE TABLE IF NOT EXISTS questions (
@@ -14,19 +16,42 @@ CREATE TABLE IF NOT EXISTS questions (
     quality_score FLOAT DEFAULT 0.0,
     access_count INTEGER DEFAULT 1,
     original_class INTEGER,
+    -- Hash blake2b de 16 bytes sobre (título, contenido): identidad de la
+    -- pregunta para el dedupe del loader y el ON CONFLICT del upsert en lote
+    content_hash BYTEA,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     first_access TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     last_access TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Índice único que respalda el ON CONFLICT (content_hash) de
+-- store_query_results_bulk
+CREATE UNIQUE INDEX IF NOT EXISTS ix_questions_content_hash ON questions(content_hash);
+
 -- Crear índices para optimizar búsquedas
 CREATE INDEX IF NOT EXISTS idx_questions_title_content ON questions(question_title, question_content);
-CREATE INDEX IF NOT EXISTS idx_questions_quality_score ON questions(quality_score);
 CREATE INDEX IF NOT EXISTS idx_questions_access_count ON questions(access_count);
 CREATE INDEX IF NOT EXISTS idx_questions_created_at ON questions(created_at);
 CREATE INDEX IF NOT EXISTS idx_questions_class ON questions(original_class);
 
+-- Índice parcial solo sobre filas sin procesar: el probe
+-- "WHERE quality_score = 0.0 LIMIT 1" toca una sola página y el índice se
+-- achica a medida que avanza el procesamiento (reemplaza al btree completo
+-- idx_questions_quality_score)
+CREATE INDEX IF NOT EXISTS idx_questions_unprocessed ON questions(id) WHERE quality_score = 0.0;
+
+-- Índice parcial para "últimas N procesadas": cubre el ORDER BY id DESC
+-- con filtro de llm_answer no vacío sin escanear filas pendientes
+CREATE INDEX IF NOT EXISTS idx_questions_processed_id_desc ON questions(id DESC)
+    WHERE llm_answer IS NOT NULL AND llm_answer <> '';
+
+-- Búsqueda de texto completo y coincidencia difusa sobre las preguntas
+CREATE INDEX IF NOT EXISTS idx_questions_fts ON questions
+    USING gin(to_tsvector('spanish', question_title || ' ' || question_content));
+CREATE INDEX IF NOT EXISTS idx_questions_title_trgm ON questions
+    USING gin(question_title gin_trgm_ops);
+
 -- Crear función para actualizar updated_at automáticamente
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
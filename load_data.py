@@ -4,13 +4,15 @@ Script para cargar datos CSV en la base de datos PostgreSQL
 Ejecuta automáticamente en Docker
 """
 
+import io
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine, text
 import sys
 import os
 import time
 
+from database import copy_escape, question_content_hash
+
 def wait_for_postgres(max_retries=30):
     """Esperar a que PostgreSQL esté disponible"""
     config = {
@@ -64,16 +66,14 @@ def main():
         print(f"Error: No se encuentra el archivo {csv_file}")
         sys.exit(1)
     
+    # Límite para pruebas del sistema de cache y tamaño de chunk de lectura
+    max_rows = 5000
+    chunk_rows = 50_000
+
     try:
         print(f"Leyendo archivo CSV: {csv_file}")
         column_names = ['original_class', 'question_title', 'question_content', 'original_answer']
-        df = pd.read_csv(csv_file, names=column_names, header=None)
-        print(f"Archivo leído: {len(df)} registros")
-        
-        # Crear conexión
-        connection_string = f"postgresql://{DATABASE_CONFIG['user']}:{DATABASE_CONFIG['password']}@{DATABASE_CONFIG['host']}:{DATABASE_CONFIG['port']}/{DATABASE_CONFIG['database']}"
-        engine = create_engine(connection_string)
-        
+
         print("Conectando a PostgreSQL...")
         
         # Crear conexión directa para verificación inicial
@@ -94,26 +94,82 @@ def main():
             print("Saltando carga de datos")
             return
         
-        # Limpiar datos nulos
-        df = df.fillna('')
-        
-        # Limitar para pruebas del sistema de cache
-        if len(df) > 5000:
-            print(f"Limitando a 5,000 registros para análisis de cache (total disponible: {len(df)})")
-            df = df.head(5000)
-        
-        print(f"Insertando {len(df)} registros en la base de datos...")
-        
-        # Insertar en lotes
-        batch_size = 1000
+        print(f"Insertando hasta {max_rows} registros en la base de datos...")
+
+        # Lectura por chunks + COPY FROM STDIN: nunca se materializa el CSV
+        # completo en RAM (pico O(chunk) en vez de O(archivo)) y la lectura
+        # se corta apenas se junta el límite de filas. El dedupe global que
+        # antes hacía drop_duplicates ahora lo resuelve el set de hashes
+        # (misma identidad que el índice único de content_hash). El buffer
+        # se arma con el escape del formato texto de COPY (los contenidos
+        # traen tabs y saltos de línea)
+        seen_hashes = set()
         total_inserted = 0
-        
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i+batch_size]
-            batch.to_sql('questions', engine, if_exists='append', index=False, method='multi')
-            total_inserted += len(batch)
-            print(f"Progreso: {total_inserted}/{len(df)} registros insertados")
-        
+
+        # original_class es la clase de Yahoo Answers (1-10): int8 en vez del
+        # int64 por defecto achica la columna 8x dentro de cada chunk
+        # na_filter=False apaga por completo la detección de NA del parser
+        # (keep_default_na solo cambiaba qué tokens se marcan): campos vacíos
+        # llegan como '' y texto tipo "N/A" se conserva literal
+        reader = pd.read_csv(csv_file, names=column_names, header=None,
+                             chunksize=chunk_rows, na_filter=False,
+                             dtype={'original_class': 'int8'})
+
+        with psycopg2.connect(**conn_params) as pg_conn:
+            with pg_conn.cursor() as cursor:
+                # La carga solo corre sobre una tabla vacía (ver chequeo de
+                # existing_count): saltarse el WAL durante el COPY duplica el
+                # throughput y no arriesga nada que no se pueda recargar.
+                # SET LOGGED al final vuelve a escribir la tabla en el WAL.
+                # La FK de multi_model_results se suelta durante la ventana:
+                # Postgres no permite que una tabla logged referencie a una
+                # unlogged, y multi_model_results está vacía en este punto,
+                # así que revalidarla al final es gratis
+                cursor.execute("""
+                    ALTER TABLE multi_model_results
+                    DROP CONSTRAINT IF EXISTS multi_model_results_question_id_fkey
+                """)
+                cursor.execute("ALTER TABLE questions SET UNLOGGED")
+
+                for chunk in reader:
+                    buf = io.StringIO()
+                    for row in chunk.itertuples(index=False):
+                        content_hash = question_content_hash(
+                            row.question_title, row.question_content)
+                        if content_hash in seen_hashes:
+                            continue
+                        seen_hashes.add(content_hash)
+
+                        buf.write('\t'.join((
+                            copy_escape(row.original_class),
+                            copy_escape(row.question_title),
+                            copy_escape(row.question_content),
+                            copy_escape(row.original_answer),
+                            copy_escape('\\x' + content_hash.hex()),
+                        )) + '\n')
+                        total_inserted += 1
+                        if total_inserted >= max_rows:
+                            break
+
+                    buf.seek(0)
+                    cursor.copy_expert(
+                        """COPY questions (original_class, question_title,
+                                           question_content, original_answer,
+                                           content_hash) FROM STDIN""",
+                        buf
+                    )
+                    print(f"Progreso: {total_inserted}/{max_rows} registros insertados")
+
+                    if total_inserted >= max_rows:
+                        break
+
+                cursor.execute("ALTER TABLE questions SET LOGGED")
+                cursor.execute("""
+                    ALTER TABLE multi_model_results
+                    ADD CONSTRAINT multi_model_results_question_id_fkey
+                    FOREIGN KEY (question_id) REFERENCES questions(id)
+                """)
+
         print(f"Datos cargados exitosamente: {total_inserted} registros")
         
         # Verificar inserción